@@ -0,0 +1,523 @@
+"""Offline benchmark for the download path.
+
+Runs a local stand-in for the Roblox endpoints (asset batch, v1 asset,
+economy details, productinfo and the CDN) plus fake Discord contexts, then
+drives download_audio / slash_download_audio end to end and reports
+throughput, per-stage latency percentiles and peak RSS. Every downloaded
+file is compared with the payload the fake CDN served. With several
+scenarios, each one runs in its own process so peak RSS is per scenario.
+
+    python benchmark.py
+    python benchmark.py --scenario prefix:1x100 --scenario prefix:50x5 --api-latency 40 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+import main
+
+DEFAULT_SCENARIOS = ["prefix:1x100", "prefix:50x5", "slash:20x5"]
+
+
+class FakeRoblox:
+    """Local stand-in for the Roblox hosts with injectable latency, errors and throttling"""
+
+    def __init__(self, api_latency, cdn_latency, jitter, error_rate, throttle_rate, payload_bytes, seed,
+                 stream_bandwidth=0):
+        self.api_latency = api_latency
+        self.cdn_latency = cdn_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.payload_bytes = payload_bytes
+        # Position-dependent bytes so a misassembled ranged download changes the file
+        self.payload = (bytes(range(251)) * (payload_bytes // 251 + 1))[:payload_bytes]
+        self.stream_bandwidth = stream_bandwidth
+        self.random = random.Random(seed)
+        self.hits = defaultdict(int)
+        self.runner = None
+        self.urls = {}
+
+    def build_app(self):
+        app = web.Application()
+        app.router.add_post("/v2/assets/batch", self.asset_batch)
+        app.router.add_get("/v1/asset/", self.asset_v1)
+        app.router.add_get("/v2/assets/{asset_id}/details", self.asset_details)
+        app.router.add_get("/marketplace/productinfo", self.product_info)
+        app.router.add_get("/audio/{asset_id}", self.audio)
+        return app
+
+    async def start(self):
+        """Serve each Roblox host on its own port so per-host limits behave like production"""
+        self.runner = web.AppRunner(self.build_app(), access_log=None)
+        await self.runner.setup()
+        for host in ("assetdelivery", "roproxy", "economy", "cdn"):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("127.0.0.1", 0))
+            await web.SockSite(self.runner, sock).start()
+            self.urls[host] = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def delay(self, base):
+        await asyncio.sleep(max(0.0, base + self.random.uniform(-self.jitter, self.jitter)))
+
+    def injected_failure(self, endpoint):
+        """Maybe answer with a 429 or 500 instead of the real response"""
+        self.hits[endpoint] += 1
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            self.hits[f"{endpoint} 429"] += 1
+            return web.Response(status=429, headers={"Retry-After": "0.2"})
+        if roll < self.throttle_rate + self.error_rate:
+            self.hits[f"{endpoint} 500"] += 1
+            return web.Response(status=500)
+        return None
+
+    async def asset_batch(self, request):
+        await self.delay(self.api_latency)
+        failure = self.injected_failure("batch")
+        if failure:
+            return failure
+        items = await request.json()
+        return web.json_response([
+            {
+                "requestId": item["requestId"],
+                "locations": [{"location": f"{self.urls['cdn']}/audio/{item['assetId']}"}]
+            }
+            for item in items
+        ])
+
+    async def asset_v1(self, request):
+        await self.delay(self.api_latency)
+        failure = self.injected_failure("v1")
+        if failure:
+            return failure
+        raise web.HTTPFound(f"{self.urls['cdn']}/audio/{request.query['id']}")
+
+    def details_payload(self, asset_id):
+        return {
+            "AssetId": int(asset_id),
+            "Name": f"Benchmark Track {asset_id}",
+            "Description": "Generated by benchmark.py " * 4,
+            "Created": "2021-03-04T05:06:07.000Z",
+            "Updated": "2022-08-09T10:11:12.000Z",
+            "Creator": {"Id": 1, "Name": "Benchmark"},
+            "PriceInRobux": None,
+            "IsLimited": False,
+            "AssetType": "Audio",
+        }
+
+    async def asset_details(self, request):
+        await self.delay(self.api_latency)
+        failure = self.injected_failure("details")
+        if failure:
+            return failure
+        return web.json_response(self.details_payload(request.match_info["asset_id"]))
+
+    async def product_info(self, request):
+        await self.delay(self.api_latency)
+        failure = self.injected_failure("productinfo")
+        if failure:
+            return failure
+        return web.json_response(self.details_payload(request.query["assetId"]))
+
+    async def audio(self, request):
+        await self.delay(self.cdn_latency)
+        failure = self.injected_failure("cdn")
+        if failure:
+            return failure
+        start, end = 0, self.payload_bytes - 1
+        status = 200
+        headers = {"Content-Type": "audio/ogg", "Accept-Ranges": "bytes"}
+        if request.http_range.start is not None or request.http_range.stop is not None:
+            self.hits["cdn range"] += 1
+            requested = request.http_range
+            start = requested.start or 0
+            end = min(end, (requested.stop or self.payload_bytes) - 1)
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{self.payload_bytes}"
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = end + 1 - start
+        await response.prepare(request)
+        position = start
+        try:
+            while position <= end:
+                chunk = self.payload[position:min(position + 65536, end + 1)]
+                if self.stream_bandwidth:
+                    await asyncio.sleep(len(chunk) / self.stream_bandwidth)  # Per-connection throughput cap
+                await response.write(chunk)
+                position += len(chunk)
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # A ranged download stops reading the first response once it has its segment
+        return response
+
+
+class Recorder:
+    """Collects per-stage durations"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.timed_keys = set()
+        self.verified = 0
+        self.corrupt = 0
+        self.bytes_uploaded = 0
+        self.uploads = 0
+        self.edits = 0
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def timed(self, stage, func, once_per_asset=False):
+        """Wrap func to record its duration; once_per_asset keeps only the first call for each asset ID"""
+        async def wrapper(*args, **kwargs):
+            if once_per_asset:
+                key = str(args[0])
+                if key in self.timed_keys:
+                    return await func(*args, **kwargs)
+                self.timed_keys.add(key)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return wrapper
+
+    def verified_download(self, func, payload):
+        """Wrap download_audio_file to compare every downloaded file with the served payload"""
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            file_path = result[0]
+            # Transcoded copies can't be compared byte for byte
+            if file_path and not file_path.endswith("-opus.ogg"):
+                with open(file_path, "rb") as f:
+                    if f.read() == payload:
+                        self.verified += 1
+                    else:
+                        self.corrupt += 1
+            return result
+        return wrapper
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None):
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.id = random.getrandbits(48)
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        self.channel.recorder.edits += 1
+        await asyncio.sleep(self.channel.latency)
+        self.content = content
+        self.embed = embed
+        return self
+
+    async def delete(self):
+        await asyncio.sleep(self.channel.latency)
+
+
+class FakeChannel:
+    """Accepts messages like a Discord channel, reading every attachment it is given"""
+
+    def __init__(self, recorder, latency, upload_bandwidth):
+        self.recorder = recorder
+        self.latency = latency
+        self.upload_bandwidth = upload_bandwidth
+        self.id = random.getrandbits(48)
+        self.messages = []
+
+    async def send(self, content=None, embed=None, file=None, files=None, **kwargs):
+        attachments = ([file] if file else []) + list(files or [])
+        started = time.perf_counter()
+        size = 0
+        for attachment in attachments:
+            size += len(attachment.fp.read())
+            attachment.close()
+        await asyncio.sleep(self.latency + size / self.upload_bandwidth)
+        if attachments:
+            self.recorder.add("upload", time.perf_counter() - started)
+            self.recorder.uploads += len(attachments)
+            self.recorder.bytes_uploaded += size
+        message = FakeMessage(self, content, embed)
+        self.messages.append(message)
+        return message
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeContext:
+    """Enough of commands.Context for the prefix commands"""
+
+    def __init__(self, user, channel):
+        self.author = user
+        self.channel = channel
+        self.message = FakeMessage(channel)
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeInteractionResponse:
+    def __init__(self, channel):
+        self.channel = channel
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+        await asyncio.sleep(self.channel.latency)
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        await self.channel.send(content, **kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, content=None, **kwargs):
+        kwargs.pop("wait", None)
+        kwargs.pop("ephemeral", None)
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeInteraction:
+    """Enough of discord.Interaction for the slash commands"""
+
+    def __init__(self, user, channel):
+        self.user = user
+        self.channel = channel
+        self.response = FakeInteractionResponse(channel)
+        self.followup = FakeFollowup(channel)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def point_bot_at(server):
+    """Send every Roblox call in main.py to the fake server"""
+    main.ASSET_BATCH_URL = f"{server.urls['assetdelivery']}/v2/assets/batch"
+    main.ASSET_V1_URL = f"{server.urls['assetdelivery']}/v1/asset/?id={{asset_id}}"
+    main.DETAILS_ENDPOINTS = [
+        ("roproxy", f"{server.urls['roproxy']}/v2/assets/{{asset_id}}/details"),
+        ("economy", f"{server.urls['economy']}/v2/assets/{{asset_id}}/details"),
+        ("productinfo", f"{server.urls['economy']}/marketplace/productinfo?assetId={{asset_id}}"),
+    ]
+
+
+def reset_bot_state(cache_dir):
+    """Fresh caches, limiters and queue so scenarios don't warm each other up"""
+    main.asset_details_cache = main.TTLCache(main.METADATA_CACHE_SIZE, main.METADATA_CACHE_TTL, main.METADATA_NEGATIVE_TTL)
+    main.audio_location_cache = main.TTLCache(main.METADATA_CACHE_SIZE, main.LOCATION_CACHE_TTL, 0)
+    main.embeds.assets = main.TTLCache(main.METADATA_CACHE_SIZE, main.METADATA_CACHE_TTL, 0)
+    main.audio_cache = main.AudioCache(cache_dir, main.AUDIO_CACHE_MAX_BYTES, main.AUDIO_CACHE_MIN_AGE)
+    main.rate_limiters.clear()
+    for name in main.details_health:
+        main.details_health[name] = main.EndpointHealth(
+            main.ENDPOINT_HEALTH_WINDOW, main.ENDPOINT_FAILURE_THRESHOLD, main.ENDPOINT_COOLDOWN
+        )
+    main.user_data.clear()
+    main.settings = main.SettingsStore(os.path.join(cache_dir, "settings.db"), main.SETTINGS_FLUSH_INTERVAL)
+    main.journal = main.JobJournal(os.path.join(cache_dir, "settings.db"), main.JOURNAL_FLUSH_INTERVAL, main.JOURNAL_MAX_AGE)
+
+
+def parse_scenario(spec):
+    """'prefix:50x5' -> ('prefix', 50 users, 5 IDs each)"""
+    kind, _, shape = spec.partition(":")
+    users, _, ids = shape.partition("x")
+    if kind not in ("prefix", "slash") or not users.isdigit() or not ids.isdigit():
+        raise argparse.ArgumentTypeError(f"bad scenario {spec!r}, expected prefix:UxN or slash:UxN")
+    return kind, int(users), int(ids)
+
+
+async def run_scenario(spec, args, recorder, first_id):
+    kind, users, per_user = parse_scenario(spec)
+    rng = random.Random(args.seed)
+    next_id = first_id
+    jobs = []
+
+    for n in range(users):
+        user = FakeUser(10_000 + n)
+        main.user_data[str(user.id)] = {"cookie": "benchmark-cookie"}
+        main.settings.set(str(user.id), place_id="1")
+        channel = FakeChannel(recorder, args.discord_latency / 1000, args.upload_bandwidth * 1024 * 1024)
+        if args.id_pool:
+            ids = [str(first_id + rng.randrange(args.id_pool)) for _ in range(per_user)]
+        else:
+            ids = [str(next_id + i) for i in range(per_user)]
+            next_id += per_user
+
+        if kind == "prefix":
+            jobs.append(main.download_audio.callback(FakeContext(user, channel), f"--{args.mode}", *ids))
+        else:
+            jobs.append(main.slash_download_audio.callback(FakeInteraction(user, channel), " ".join(ids)))
+
+    async def timed_command(job):
+        started = time.perf_counter()
+        await job
+        recorder.add("command", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_command(job) for job in jobs))
+    return users * per_user, time.perf_counter() - started
+
+
+def report(spec, assets, elapsed, recorder, server):
+    print(f"\n== {spec}: {assets} assets in {elapsed:.2f}s ({assets / elapsed:.1f} assets/s)")
+    print(f"   uploads={recorder.uploads} bytes={main.human_readable_size(recorder.bytes_uploaded)} "
+          f"progress_edits={recorder.edits} peak_rss={peak_rss_mb():.1f} MB "
+          f"verified={recorder.verified} corrupt={recorder.corrupt}")
+    if recorder.corrupt:
+        print(f"   !! {recorder.corrupt} downloaded file(s) did not match the payload the CDN served")
+    print(f"   {'stage':<10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in ("details", "location", "download", "upload", "command"):
+        samples = recorder.samples.get(stage, [])
+        print(f"   {stage:<10} {len(samples):>6} "
+              f"{percentile(samples, 0.5) * 1000:>9.1f} {percentile(samples, 0.95) * 1000:>9.1f} "
+              f"{percentile(samples, 0.99) * 1000:>9.1f}")
+    print(f"   server hits: {dict(sorted(server.hits.items()))}")
+    return {
+        "scenario": spec,
+        "assets": assets,
+        "seconds": elapsed,
+        "assets_per_second": assets / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "verified": recorder.verified,
+        "corrupt": recorder.corrupt,
+        "stages": {
+            stage: {
+                "count": len(samples),
+                "p50": percentile(samples, 0.5),
+                "p95": percentile(samples, 0.95),
+                "p99": percentile(samples, 0.99),
+            }
+            for stage, samples in recorder.samples.items()
+        },
+    }
+
+
+async def run(args):
+    server = FakeRoblox(
+        args.api_latency / 1000, args.cdn_latency / 1000, args.jitter / 1000,
+        args.error_rate, args.throttle_rate, args.payload_kb * 1024, args.seed,
+        stream_bandwidth=args.cdn_stream_kbps * 1024
+    )
+    await server.start()
+    point_bot_at(server)
+    main.UPLOAD_INTERVAL = args.upload_interval
+    # Scenarios like 1x100 are meant to exceed the per-user queue cap
+    main.download_queue.per_user_limit = max(main.download_queue.per_user_limit, *(
+        parse_scenario(spec)[2] for spec in args.scenario
+    ))
+
+    # Time each stage by wrapping the module functions the pipeline calls. Locations are resolved
+    # by the queue's prefetch and again (from its cache) by the download, so only time the first call
+    results = []
+    originals = (main.fetch_asset_details, main.fetch_audio_location, main.download_audio_file)
+    try:
+        for n, spec in enumerate(args.scenario):
+            recorder = Recorder()
+            main.fetch_asset_details = recorder.timed("details", originals[0])
+            main.fetch_audio_location = recorder.timed("location", originals[1], once_per_asset=True)
+            main.download_audio_file = recorder.verified_download(
+                recorder.timed("download", originals[2]), server.payload
+            )
+            server.hits.clear()
+            with tempfile.TemporaryDirectory(prefix="audio-bench-") as cache_dir:
+                reset_bot_state(cache_dir)
+                assets, elapsed = await run_scenario(spec, args, recorder, 1_000_000 * (n + 1))
+                await main.download_queue.stop()
+            results.append(report(spec, assets, elapsed, recorder, server))
+    finally:
+        main.fetch_asset_details, main.fetch_audio_location, main.download_audio_file = originals
+        await main.close_http_clients()
+        await server.stop()
+    return results
+
+
+def run_in_process(args, spec):
+    """Run one scenario; called in a fresh process so peak RSS isn't carried over from earlier ones"""
+    args.scenario = [spec]
+    results = asyncio.run(run(args))
+    sys.stdout.flush()  # The pool terminates its worker without flushing
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the !download path against a local fake Roblox/Discord")
+    parser.add_argument("--scenario", action="append", type=str,
+                        help="prefix:UxN or slash:UxN (U users, N IDs each); repeatable")
+    parser.add_argument("--api-latency", type=float, default=30.0, help="ms per Roblox API call")
+    parser.add_argument("--cdn-latency", type=float, default=20.0, help="ms before the CDN starts sending")
+    parser.add_argument("--jitter", type=float, default=10.0, help="± ms added to every latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Roblox calls answering 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of Roblox calls answering 429")
+    parser.add_argument("--payload-kb", type=int, default=512, help="audio size served by the CDN")
+    parser.add_argument("--cdn-stream-kbps", type=float, default=0.0,
+                        help="per-connection CDN throughput in KB/s (0 = unlimited); shows the effect of ranged downloads")
+    parser.add_argument("--discord-latency", type=float, default=50.0, help="ms per Discord API call")
+    parser.add_argument("--upload-bandwidth", type=float, default=20.0, help="Discord upload MB/s")
+    parser.add_argument("--upload-interval", type=float, default=0.0,
+                        help="seconds between uploads (the bot's UPLOAD_INTERVAL; 0 measures the Roblox path)")
+    parser.add_argument("--mode", choices=["single", "bundle", "zip"], default="single",
+                        help="output mode for prefix scenarios")
+    parser.add_argument("--id-pool", type=int, default=0,
+                        help="draw IDs from a shared pool of this size to exercise caching (0 = all distinct)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    args = parser.parse_args()
+    args.scenario = args.scenario or DEFAULT_SCENARIOS
+    for spec in args.scenario:
+        parse_scenario(spec)
+
+    if len(args.scenario) == 1:
+        results = asyncio.run(run(args))
+    else:
+        # The bot already uses spawn for its worker processes, so the benchmark does too
+        context = multiprocessing.get_context("spawn")
+        results = []
+        for spec in args.scenario:
+            with context.Pool(1) as pool:
+                results.extend(pool.apply(run_in_process, (args, spec)))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
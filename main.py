@@ -1,29 +1,439 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import requests
+import httpx
+from flask import Flask, Response
+from werkzeug.serving import WSGIRequestHandler, make_server
+import importlib.util
 import random
 import time
 import re
 import os
+import hashlib
+import uuid
+import json
+import sqlite3
 import asyncio
+import contextvars
+import threading
+import multiprocessing
+import itertools
+import zlib
+import tempfile
+import csv
+import shutil
+import zipfile
 from io import BytesIO
+from collections import OrderedDict, defaultdict, deque
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+import dataclasses
 import datetime
+import email.utils
+
+def env_int(name, default):
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def env_float(name, default):
+    """Read a float setting from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def env_bool(name, default):
+    """Read an on/off setting from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# HTTP client settings
+HTTP_TIMEOUT = env_float("HTTP_TIMEOUT", 30.0)
+HTTP_CONNECT_TIMEOUT = env_float("HTTP_CONNECT_TIMEOUT", 10.0)
+HTTP_KEEPALIVE_EXPIRY = env_float("HTTP_KEEPALIVE_EXPIRY", 60.0)
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_ENABLED = env_bool("HTTP2_ENABLED", True) and importlib.util.find_spec("h2") is not None
+
+# Decode Roblox API responses with orjson when it's installed
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+    json_loads = orjson.loads
+else:
+    json_loads = json.loads
+
+# One keep-alive pool per Roblox host group, sized independently
+HTTP_POOL_SIZES = {
+    "assetdelivery": env_int("HTTP_POOL_ASSETDELIVERY", 20),
+    "economy": env_int("HTTP_POOL_ECONOMY", 20),
+    "cdn": env_int("HTTP_POOL_CDN", 40),
+    "default": env_int("HTTP_POOL_DEFAULT", 10),
+}
+
+http_clients = {}
+
+# Per-host rate limiting and retries
+RATE_LIMIT_INITIAL = env_float("RATE_LIMIT_INITIAL", 20.0)  # Requests per second per host
+RATE_LIMIT_MIN = env_float("RATE_LIMIT_MIN", 1.0)
+RATE_LIMIT_MAX = env_float("RATE_LIMIT_MAX", 50.0)
+RATE_LIMIT_BURST = env_float("RATE_LIMIT_BURST", 10.0)
+RATE_LIMIT_INCREASE = env_float("RATE_LIMIT_INCREASE", 0.5)  # Added to the rate after each success
+RATE_LIMIT_DECREASE = env_float("RATE_LIMIT_DECREASE", 0.5)  # Rate multiplier after a 429/503
+RETRY_ATTEMPTS = env_int("RETRY_ATTEMPTS", 3)
+RETRY_BASE_DELAY = env_float("RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY = env_float("RETRY_MAX_DELAY", 10.0)
+RETRY_AFTER_MAX = env_float("RETRY_AFTER_MAX", 30.0)  # Longest Retry-After pause honored per host
+
+# Asset location batching (v2/assets/batch)
+LOCATION_BATCH_SIZE = env_int("LOCATION_BATCH_SIZE", 50)
+LOCATION_BATCH_WINDOW = env_float("LOCATION_BATCH_WINDOW", 0.05)  # Seconds to wait for more IDs
+LOCATION_CACHE_TTL = env_float("LOCATION_CACHE_TTL", 120.0)  # Seconds a resolved CDN URL is reused
+
+# Asset metadata cache
+METADATA_CACHE_SIZE = env_int("METADATA_CACHE_SIZE", 5000)
+METADATA_CACHE_TTL = env_float("METADATA_CACHE_TTL", 3600.0)  # Seconds
+METADATA_NEGATIVE_TTL = env_float("METADATA_NEGATIVE_TTL", 60.0)  # Seconds to remember missing assets
+
+# On-disk audio cache
+AUDIO_CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", "audio_cache")
+AUDIO_CACHE_MAX_BYTES = env_int("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3)
+AUDIO_CACHE_MIN_AGE = env_float("AUDIO_CACHE_MIN_AGE", 600.0)  # Seconds a file is kept after its last use
+
+# Discord rejects attachments over this size, so larger downloads are stopped early
+AUDIO_MAX_BYTES = env_int("AUDIO_MAX_BYTES", 10 * 1024 ** 2)
+DOWNLOAD_CHUNK_SIZE = env_int("DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+RANGED_DOWNLOAD_THRESHOLD = env_int("RANGED_DOWNLOAD_THRESHOLD", 2 * 1024 ** 2)  # Smaller files use a single request
+RANGED_SEGMENT_SIZE = env_int("RANGED_SEGMENT_SIZE", 1024 ** 2)
+RANGED_CONNECTIONS = env_int("RANGED_CONNECTIONS", 4)  # Concurrent segment requests per file
+RANGED_SEGMENT_RETRIES = env_int("RANGED_SEGMENT_RETRIES", 3)
+
+# Re-encode audio over the upload limit to Opus with a local ffmpeg, when one is installed
+TRANSCODE_ENABLED = env_bool("TRANSCODE_ENABLED", True)
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH") or shutil.which("ffmpeg")
+TRANSCODE_MAX_SOURCE_BYTES = env_int("TRANSCODE_MAX_SOURCE_BYTES", 100 * 1024 ** 2)  # Larger sources are not downloaded
+TRANSCODE_CONCURRENCY = env_int("TRANSCODE_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2))
+TRANSCODE_MAX_BITRATE = env_int("TRANSCODE_MAX_BITRATE", 128_000)  # Bits per second
+TRANSCODE_MIN_BITRATE = 6_000  # Opus can't go lower
+TRANSCODE_TIMEOUT = env_float("TRANSCODE_TIMEOUT", 300.0)
+DISCORD_MAX_ATTACHMENTS = 10  # Per message, also the embed limit
+DISCORD_MAX_EMBED_CHARS = 6000  # Combined across all embeds in a message
+
+# Details endpoint health tracking
+ENDPOINT_HEALTH_WINDOW = env_int("ENDPOINT_HEALTH_WINDOW", 50)  # Recent calls kept per endpoint
+ENDPOINT_FAILURE_THRESHOLD = env_int("ENDPOINT_FAILURE_THRESHOLD", 3)  # Consecutive failures that open the breaker
+ENDPOINT_COOLDOWN = env_float("ENDPOINT_COOLDOWN", 30.0)  # Seconds a failing endpoint is skipped
+HEDGE_ENABLED = env_bool("HEDGE_ENABLED", False)
+HEDGE_PERCENTILE = env_float("HEDGE_PERCENTILE", 0.9)  # Latency percentile that triggers a hedged request
+
+# Prometheus metrics endpoint (set METRICS_PORT=0 to disable)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = env_int("METRICS_PORT", 9108)
+
+# Persistent user settings (place ID, default output mode)
+SETTINGS_DB = os.environ.get("SETTINGS_DB", "bot_settings.db")
+SETTINGS_FLUSH_INTERVAL = env_float("SETTINGS_FLUSH_INTERVAL", 1.0)  # Seconds between batched writes
+
+# Download job journal, used to resume batches interrupted by a restart
+JOURNAL_DB = os.environ.get("JOURNAL_DB", SETTINGS_DB)
+JOURNAL_FLUSH_INTERVAL = env_float("JOURNAL_FLUSH_INTERVAL", 1.0)  # Seconds between batched writes
+JOURNAL_MAX_AGE = env_float("JOURNAL_MAX_AGE", 24 * 3600.0)  # Older unfinished jobs are dropped instead of resumed
+
+# Download pipeline settings
+DOWNLOAD_CONCURRENCY = env_int("DOWNLOAD_CONCURRENCY", 8)  # Concurrent downloads per process
+DOWNLOAD_PROCESSES = env_int("DOWNLOAD_PROCESSES", 0)  # Download worker processes; 0 downloads in the bot process
+SHARD_COUNT = env_int("SHARD_COUNT", 0)  # 0 uses Discord's recommended shard count
+DOWNLOAD_DEADLINE = env_float("DOWNLOAD_DEADLINE", 45.0)  # Seconds a command may take, plus the per-asset allowance
+DOWNLOAD_DEADLINE_PER_ASSET = env_float("DOWNLOAD_DEADLINE_PER_ASSET", 5.0)
+BUSY_QUEUE_DEPTH = env_int("BUSY_QUEUE_DEPTH", 1000)  # Refuse new commands while this many assets are queued
+BUSY_IN_FLIGHT = env_int("BUSY_IN_FLIGHT", 200)  # ...or while this many Roblox requests are in flight (in all processes)
+MAX_QUEUED_PER_USER = env_int("MAX_QUEUED_PER_USER", 50)
+DEFAULT_OUTPUT_MODE = os.environ.get("DEFAULT_OUTPUT_MODE", "single")  # single, bundle or zip
+MAX_ID_FILE_BYTES = env_int("MAX_ID_FILE_BYTES", 64 * 1024)
+PROGRESS_INTERVAL = env_float("PROGRESS_INTERVAL", 2.0)  # Minimum seconds between progress message edits
+UPLOAD_INTERVAL = env_float("UPLOAD_INTERVAL", 1.0)  # Minimum seconds between Discord uploads
 
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
 
-# Global storage for user data
+class AudioBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.unready_since = time.monotonic()  # Start of the current cold start or reconnect
+        self.was_ready = False
+        self.sync_lock = asyncio.Lock()
+
+    async def setup_hook(self):
+        await asyncio.to_thread(settings.load)
+        settings.start()
+        await asyncio.to_thread(journal.load)
+        journal.start()
+        start_http_clients()
+        await asyncio.to_thread(audio_cache.load)
+        process_pool.start()
+        download_queue.start()
+        start_metrics_server(asyncio.get_running_loop())
+
+    async def close(self):
+        await download_queue.stop()
+        await process_pool.stop()
+        await journal.close()
+        await settings.close()
+        await close_http_clients()
+        await super().close()
+
+# Let Discord pick the shard count unless one is configured
+bot = AudioBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT or None)
+
+# Roblox cookies, kept in memory only
 user_data = {}
 
-def sleep():
-    """Small sleep with random variance to simulate human behavior"""
-    t = 0.01
-    t += t * random.uniform(-0.1, 0.1)
-    time.sleep(t)
-    
+class BatchedSQLiteStore:
+    """A SQLite database (WAL mode) whose writes are queued in memory and flushed in batches
+
+    Subclasses provide the schema, and take_batch/write/requeue for their own
+    batch format. A background task flushes every flush_interval seconds, so
+    callers never wait on the disk.
+    """
+    schema = ()
+    label = "database"
+
+    def __init__(self, path, flush_interval):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.connection = None
+        self.write_lock = threading.Lock()
+        self.task = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                self.connection.execute(statement)
+        return self.connection
+
+    def take_batch(self):
+        """Hand over the queued writes, or None if there are none"""
+        raise NotImplementedError
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def requeue(self, batch):
+        """Put back a batch that failed to write"""
+        raise NotImplementedError
+
+    async def flush(self):
+        batch = self.take_batch()
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.write, batch)
+        except Exception as e:
+            print(f"Error writing {self.label}: {e}")
+            self.requeue(batch)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+        if self.connection is not None:
+            with self.write_lock:
+                self.connection.close()
+                self.connection = None
+
+class SettingsStore(BatchedSQLiteStore):
+    """Non-secret per-user preferences
+
+    Reads come from an in-memory snapshot and never touch the database.
+    Writes update the snapshot immediately and are flushed in batches.
+    Cookies are never stored here. Bot-wide values such as the command
+    tree fingerprint live in a separate bot_state table and are written
+    straight through.
+    """
+    schema = (
+        "CREATE TABLE IF NOT EXISTS user_settings (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    )
+    label = "settings"
+
+    def __init__(self, path, flush_interval):
+        super().__init__(path, flush_interval)
+        self.snapshot = {}
+        self.dirty = {}
+
+    def load(self):
+        """Read every user's settings into the snapshot in one query"""
+        with self.write_lock:
+            rows = self.connect().execute("SELECT user_id, data FROM user_settings").fetchall()
+        snapshot = {}
+        for user_id, data in rows:
+            try:
+                snapshot[user_id] = json.loads(data)
+            except ValueError:
+                print(f"Ignoring unreadable settings for user {user_id}")
+        self.snapshot = snapshot
+        print(f"Loaded settings for {len(snapshot)} user(s)")
+
+    def get(self, user_id, key, default=None):
+        return self.snapshot.get(user_id, {}).get(key, default)
+
+    def set(self, user_id, **values):
+        # Replace the user's dict rather than mutating it, so a reader never sees half an update
+        settings = {**self.snapshot.get(user_id, {}), **values}
+        self.snapshot[user_id] = settings
+        self.dirty[user_id] = settings
+
+    def take_batch(self):
+        batch, self.dirty = self.dirty, {}
+        return batch
+
+    def write(self, batch):
+        with self.write_lock:
+            connection = self.connect()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO user_settings (user_id, data) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+                    [(user_id, json.dumps(data)) for user_id, data in batch.items()]
+                )
+
+    def requeue(self, batch):
+        # Keep the batch for the next flush unless newer values replaced it
+        self.dirty = {**batch, **self.dirty}
+
+    def get_state(self, key):
+        with self.write_lock:
+            row = self.connect().execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.write_lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    "INSERT INTO bot_state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, value)
+                )
+
+settings = SettingsStore(SETTINGS_DB, SETTINGS_FLUSH_INTERVAL)
+
+class JobJournal(BatchedSQLiteStore):
+    """Append-only log of download jobs and each asset's outcome
+
+    On startup, unfinished jobs are loaded so they can be resumed once their
+    user's cookie is set again (cookies are never written here).
+    """
+    schema = (
+        "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+        "channel_id INTEGER, message_id INTEGER, place_id TEXT, mode TEXT, content TEXT, "
+        "asset_ids TEXT NOT NULL, created_at REAL NOT NULL, finished_at REAL)",
+        "CREATE TABLE IF NOT EXISTS job_assets (job_id TEXT NOT NULL, asset_id TEXT NOT NULL, "
+        "error TEXT, PRIMARY KEY (job_id, asset_id))",
+    )
+    label = "job journal"
+
+    def __init__(self, path, flush_interval, max_age):
+        super().__init__(path, flush_interval)
+        self.max_age = max_age
+        self.pending = []
+        self.incomplete = defaultdict(list)
+
+    def load(self):
+        """Drop finished and expired jobs, then load the ones left to resume"""
+        with self.write_lock:
+            connection = self.connect()
+            with connection:
+                stale = "SELECT job_id FROM jobs WHERE finished_at IS NOT NULL OR created_at < ?"
+                cutoff = time.time() - self.max_age
+                connection.execute(f"DELETE FROM job_assets WHERE job_id IN ({stale})", (cutoff,))
+                connection.execute(f"DELETE FROM jobs WHERE job_id IN ({stale})", (cutoff,))
+            jobs = connection.execute(
+                "SELECT job_id, user_id, channel_id, message_id, place_id, mode, content, asset_ids "
+                "FROM jobs ORDER BY created_at"
+            ).fetchall()
+            outcomes = connection.execute("SELECT job_id, asset_id, error FROM job_assets").fetchall()
+            
+        settled = defaultdict(dict)
+        for job_id, asset_id, error in outcomes:
+            settled[job_id][asset_id] = error
+        self.incomplete = defaultdict(list)
+        for job_id, user_id, channel_id, message_id, place_id, mode, content, asset_ids in jobs:
+            self.incomplete[user_id].append({
+                "job_id": job_id, "user_id": user_id, "channel_id": channel_id, "message_id": message_id,
+                "place_id": place_id, "mode": mode, "content": content,
+                "asset_ids": json.loads(asset_ids), "settled": settled[job_id]
+            })
+        count = sum(len(jobs) for jobs in self.incomplete.values())
+        if count:
+            print(f"Found {count} interrupted download job(s) to resume")
+
+    def open_job(self, user_id, asset_ids, place_id, mode, content, message):
+        """Record a new job; returns its journal entry"""
+        job = {
+            "job_id": uuid.uuid4().hex, "user_id": user_id,
+            "channel_id": message.channel.id, "message_id": message.id,
+            "place_id": place_id, "mode": mode, "content": content,
+            "asset_ids": list(asset_ids), "settled": {}
+        }
+        self.pending.append((
+            "INSERT INTO jobs (job_id, user_id, channel_id, message_id, place_id, mode, content, asset_ids, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["job_id"], user_id, job["channel_id"], job["message_id"], place_id, mode, content,
+             json.dumps(job["asset_ids"]), time.time())
+        ))
+        return job
+
+    def record(self, job, asset_id, error):
+        """Record that an asset was delivered (error None) or failed"""
+        job["settled"][asset_id] = error
+        self.pending.append((
+            "INSERT OR REPLACE INTO job_assets (job_id, asset_id, error) VALUES (?, ?, ?)",
+            (job["job_id"], asset_id, error)
+        ))
+
+    def close_job(self, job):
+        self.pending.append(("UPDATE jobs SET finished_at = ? WHERE job_id = ?", (time.time(), job["job_id"])))
+
+    def take_incomplete(self, user_id):
+        """Hand over a user's interrupted jobs, at most once"""
+        return self.incomplete.pop(user_id, [])
+
+    def take_batch(self):
+        batch, self.pending = self.pending, []
+        return batch
+
+    def write(self, batch):
+        with self.write_lock:
+            connection = self.connect()
+            with connection:
+                for statement, params in batch:
+                    connection.execute(statement, params)
+
+    def requeue(self, batch):
+        # Statements must land in order, so retry the batch ahead of anything newer
+        self.pending = batch + self.pending
+
+journal = JobJournal(JOURNAL_DB, JOURNAL_FLUSH_INTERVAL, JOURNAL_MAX_AGE)
+
 def human_readable_size(size_bytes):
     """Convert bytes to human readable format"""
     if size_bytes == 0:
@@ -36,6 +446,544 @@ def human_readable_size(size_bytes):
     f = ('%.2f' % size_bytes).rstrip('0').rstrip('.')
     return '%s %s' % (f, suffixes[i])
 
+class Metrics:
+    """Counters, histograms and gauges rendered in the Prometheus text format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.descriptions = {}
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # One slot per bucket, then sum and count
+            histogram = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def gauge(self, name, func, help_text):
+        """Register a gauge read at scrape time; func returns a number or {labels: number}"""
+        self.describe(name, "gauge", help_text)
+        self.gauges[name] = func
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def render(self):
+        lines = []
+        grouped = defaultdict(list)
+        for (name, labels), value in self.counters.items():
+            grouped[name].append((labels, value))
+        for (name, labels), histogram in self.histograms.items():
+            grouped[name].append((labels, histogram))
+        for name, func in self.gauges.items():
+            try:
+                value = func()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                grouped[name].extend((tuple(sorted(labels)), v) for labels, v in value.items())
+            else:
+                grouped[name].append(((), value))
+                
+        for name in sorted(grouped):
+            kind, help_text = self.descriptions.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in grouped[name]:
+                if kind != "histogram":
+                    lines.append(f"{name}{self.format_labels(labels)} {value}")
+                    continue
+                for bound, count in zip(self.buckets, value):
+                    lines.append(f"{name}_bucket{self.format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{self.format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics((0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+metrics.describe("audio_stage_seconds", "histogram", "Time spent in each stage of an audio download")
+metrics.describe("audio_downloads_total", "counter", "Audio downloads by result and reason")
+metrics.describe("audio_bytes_downloaded_total", "counter", "Bytes received from the Roblox CDN")
+metrics.describe("discord_uploads_total", "counter", "Discord uploads by result")
+metrics.describe("discord_bytes_uploaded_total", "counter", "Bytes uploaded to Discord")
+metrics.describe("roblox_requests_total", "counter", "Roblox HTTP responses by host group and status")
+metrics.describe("audio_segment_retries_total", "counter", "Byte-range segments re-requested after a failure or short read")
+metrics.describe("download_commands_rejected_total", "counter", "Download commands turned away because the bot was overloaded")
+metrics.describe("bot_ready_seconds", "histogram", "Time from starting or losing the gateway connection to being ready")
+metrics.describe("command_syncs_total", "counter", "Slash command tree syncs by result")
+
+@contextmanager
+def time_stage(stage):
+    """Record how long the wrapped block took in audio_stage_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe("audio_stage_seconds", time.perf_counter() - started, stage=stage)
+
+def record_download(result, reason):
+    metrics.inc("audio_downloads_total", result=result, reason=reason)
+
+@contextmanager
+def count_upload(size):
+    """Count a Discord upload as a success unless the wrapped send raises"""
+    try:
+        yield
+    except Exception:
+        metrics.inc("discord_uploads_total", result="failure")
+        raise
+    metrics.inc("discord_uploads_total", result="success")
+    metrics.inc("discord_bytes_uploaded_total", size)
+
+def http_pool_for(url):
+    """Pick the connection pool a URL belongs to"""
+    host = (urlsplit(url).hostname or "").lower()
+    if host.startswith("assetdelivery."):
+        return "assetdelivery"
+    if host.startswith("economy.") or host == "api.roblox.com":
+        return "economy"
+    if host.endswith(".rbxcdn.com"):
+        return "cdn"
+    return "default"
+
+def create_http_client(pool):
+    """Create a pooled async HTTP client for one host group"""
+    size = HTTP_POOL_SIZES[pool]
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+
+def start_http_clients():
+    """Open the shared HTTP clients (called once at bot startup)"""
+    for pool in HTTP_POOL_SIZES:
+        if pool not in http_clients:
+            http_clients[pool] = create_http_client(pool)
+
+async def close_http_clients():
+    """Close the shared HTTP clients and their idle connections"""
+    clients = list(http_clients.values())
+    http_clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Error closing HTTP client: {e}")
+
+def get_http_client(url):
+    """Return the shared client for a URL, creating it on first use"""
+    pool = http_pool_for(url)
+    client = http_clients.get(pool)
+    if client is None:
+        client = http_clients[pool] = create_http_client(pool)
+    return client
+
+class HostRateLimiter:
+    """Token bucket for one host that backs off on 429/503 and speeds up again on success"""
+
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for a token (and for any Retry-After pause to pass)"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + RATE_LIMIT_INCREASE)
+
+    def on_throttle(self, retry_after=None):
+        """Halve the rate, and pause the host entirely if it told us how long to wait"""
+        self.rate = max(self.min_rate, self.rate * RATE_LIMIT_DECREASE)
+        self.tokens = 0
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+rate_limiters = {}
+http_in_flight = 0
+
+def rate_limiter_for(url):
+    host = urlsplit(url).netloc.lower()
+    limiter = rate_limiters.get(host)
+    if limiter is None:
+        limiter = rate_limiters[host] = HostRateLimiter(
+            RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_BURST
+        )
+    return limiter
+
+def parse_retry_after(value):
+    """Retry-After as seconds, capped at RETRY_AFTER_MAX; it may be a delay or an HTTP date"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    # The pause blocks every request to the host, including shared ones that have no deadline
+    return min(RETRY_AFTER_MAX, max(0.0, seconds))
+
+class DeadlineExceeded(Exception):
+    def __init__(self, message="the command ran out of time"):
+        super().__init__(message)
+
+class Deadline:
+    """The time budget a command has left; every stage and request gets at most what remains"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, limit):
+        """The smaller of a stage's own timeout and the remaining budget"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        return remaining if limit is None else min(limit, remaining)
+
+# The deadline of the command the current task is working for, if any
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+async def within_deadline(awaitable):
+    """Await a stage, giving up with DeadlineExceeded when the command's budget runs out"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, deadline.timeout(None))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded() from None
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter so retries from many commands don't line up"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+async def roblox_request(method, url, stream=False, retry=None, follow_redirects=False, **kwargs):
+    """Send through the host's pooled client and rate limiter, retrying throttled idempotent requests"""
+    global http_in_flight
+    if retry is None:
+        retry = method in ("GET", "HEAD")
+    attempts = RETRY_ATTEMPTS + 1 if retry else 1
+    client = get_http_client(url)
+    limiter = rate_limiter_for(url)
+    deadline = current_deadline.get()
+    timeout = kwargs.get("timeout", HTTP_TIMEOUT)
+    
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        await limiter.acquire()
+        http_in_flight += 1
+        try:
+            if deadline:
+                kwargs["timeout"] = deadline.timeout(timeout)
+            request = client.build_request(method, url, **kwargs)
+            response = await client.send(request, stream=stream, follow_redirects=follow_redirects)
+        except httpx.TransportError:
+            metrics.inc("roblox_requests_total", pool=http_pool_for(url), status="error")
+            if deadline and deadline.expired():
+                raise DeadlineExceeded() from None  # Our budget ran out, not the host
+            delay = backoff_delay(attempt)
+            if last_attempt or (deadline and deadline.remaining() < delay):
+                raise
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            http_in_flight -= 1
+            
+        metrics.inc("roblox_requests_total", pool=http_pool_for(url), status=response.status_code)
+        if response.status_code not in (429, 503):
+            limiter.on_success()
+            return response
+            
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        limiter.on_throttle(retry_after)
+        delay = max(retry_after or 0, backoff_delay(attempt))
+        # Hand back the throttled response rather than sleeping past the command's deadline
+        if last_attempt or (deadline and deadline.remaining() < delay):
+            return response
+        await response.aclose()
+        await asyncio.sleep(delay)
+
+@asynccontextmanager
+async def roblox_stream(method, url, **kwargs):
+    """Like roblox_request, but leaves the body unread so it can be streamed"""
+    response = await roblox_request(method, url, stream=True, **kwargs)
+    try:
+        yield response
+    finally:
+        await response.aclose()
+
+CACHE_MISS = object()
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry; None values are cached as negatives"""
+
+    def __init__(self, max_entries, ttl, negative_ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value, or CACHE_MISS if absent or expired"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return CACHE_MISS
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return CACHE_MISS
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class SingleFlight:
+    """Let concurrent callers for the same key share one in-flight call"""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, func):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(func))
+            self.calls[key] = future
+            future.add_done_callback(lambda f: self.forget(key, f))
+        # Shield so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    async def run(self, func):
+        # The call is shared, so it must not inherit the first caller's deadline; callers bound their own wait
+        current_deadline.set(None)
+        return await func()
+
+    def forget(self, key, future):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+
+asset_details_cache = TTLCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_NEGATIVE_TTL)
+asset_details_flight = SingleFlight()
+# Only found locations are kept; misses are retried on the next request
+audio_location_cache = TTLCache(METADATA_CACHE_SIZE, LOCATION_CACHE_TTL, 0)
+audio_location_flight = SingleFlight()
+audio_download_flight = SingleFlight()
+audio_transcode_flight = SingleFlight()
+prefetch_tasks = set()
+
+# Transcoded copies carry an -opus suffix and are cached under "<asset_id>-opus"
+AUDIO_CACHE_NAME = re.compile(r"(\d+)-([0-9a-f]{16})(-opus)?\.ogg")
+
+class AudioCache:
+    """Audio files on disk keyed by asset ID plus content hash, evicted LRU by last access"""
+
+    def __init__(self, directory, max_bytes, min_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.loaded = False
+        self.owner = True  # Download worker processes share the directory but leave cleanup to the bot
+
+    def load(self):
+        """Index the files left on disk by earlier runs"""
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            match = AUDIO_CACHE_NAME.fullmatch(name)
+            try:
+                if match:
+                    stat = os.stat(path)
+                    found.append((stat.st_mtime, match.group(1) + (match.group(3) or ""), path, stat.st_size))
+                elif name.startswith(".tmp-") and self.owner:
+                    os.remove(path)  # Left behind by an interrupted download
+            except OSError:
+                pass
+                
+        for last_access, asset_id, path, size in sorted(found):
+            self.add(asset_id, path, size, last_access)
+        self.evict()
+
+    def add(self, asset_id, path, size, last_access):
+        old = self.entries.pop(asset_id, None)
+        if old:
+            self.total_bytes -= old[1]
+            if old[0] != path:
+                self.remove_file(old[0])  # Superseded by newer content
+        self.entries[asset_id] = (path, size, last_access)
+        self.total_bytes += size
+
+    def adopt(self, path):
+        """Index a file that a download worker process wrote into the cache directory"""
+        self.load()
+        match = AUDIO_CACHE_NAME.fullmatch(os.path.basename(path))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if match:
+            self.add(match.group(1) + (match.group(3) or ""), path, size, time.time())
+            self.evict()
+
+    def lookup(self, asset_id):
+        """Return the cached file for an asset, or None"""
+        self.load()
+        asset_id = str(asset_id)
+        entry = self.entries.get(asset_id)
+        if entry is None:
+            return None
+        path, size, _ = entry
+        if not os.path.exists(path):
+            del self.entries[asset_id]
+            self.total_bytes -= size
+            return None
+            
+        now = time.time()
+        self.entries[asset_id] = (path, size, now)
+        self.entries.move_to_end(asset_id)
+        try:
+            os.utime(path, (now, now))  # Persist last access for the next startup
+        except OSError:
+            pass
+        return path
+
+    def temp_path(self):
+        """Unique scratch path inside the cache directory"""
+        self.load()
+        return os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}")
+
+    def commit(self, asset_id, temp_path, digest, suffix=""):
+        """Atomically rename a finished temp file into place and index it"""
+        asset_id = str(asset_id)
+        path = os.path.join(self.directory, f"{asset_id}-{digest[:16]}{suffix}.ogg")
+        os.replace(temp_path, path)
+        self.add(asset_id + suffix, path, os.path.getsize(path), time.time())
+        self.evict()
+        return path
+
+    def evict(self):
+        """Drop least recently used files until the cache fits its size budget"""
+        # Recently used files may still be uploading, so never evict inside min_age
+        if not self.owner:
+            return
+        cutoff = time.time() - self.min_age
+        while self.total_bytes > self.max_bytes and self.entries:
+            asset_id, (path, size, last_access) = next(iter(self.entries.items()))
+            if last_access > cutoff:
+                break
+            del self.entries[asset_id]
+            self.total_bytes -= size
+            self.remove_file(path)
+
+    def remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, AUDIO_CACHE_MIN_AGE)
+
+class UploadPacer:
+    """Space out Discord uploads without delaying the downloads behind them"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.next_slot > now:
+                await asyncio.sleep(self.next_slot - now)
+                now = self.next_slot
+            self.next_slot = now + self.interval
+
 def format_timestamp(timestamp):
     """Format ISO timestamp to readable date"""
     try:
@@ -44,7 +992,113 @@ def format_timestamp(timestamp):
     except:
         return timestamp
 
+ASSET_BATCH_URL = "https://assetdelivery.roblox.com/v2/assets/batch"
+ASSET_V1_URL = "https://assetdelivery.roblox.com/v1/asset/?id={asset_id}"
+
+def roblox_asset_headers(place_id, roblox_cookie):
+    """Build the headers asset delivery expects for a user's cookie and place"""
+    return {
+        "User-Agent": "Roblox/WinInet",
+        "Content-Type": "application/json",
+        "Cookie": f".ROBLOSECURITY={roblox_cookie}",
+        "Roblox-Place-Id": str(place_id),
+        "Accept": "*/*",
+        "Roblox-Browser-Asset-Request": "true"
+    }
+
+class LocationBatcher:
+    """Collect location lookups per (cookie, place_id) and resolve them in one batch request"""
+
+    def __init__(self, max_size, window):
+        self.max_size = max_size
+        self.window = window
+        self.pending = {}
+        self.timers = {}
+        self.tasks = set()
+
+    async def resolve(self, asset_id, place_id, roblox_cookie):
+        """Queue an asset ID and wait for its location (None if the batch had none)"""
+        loop = asyncio.get_running_loop()
+        key = (roblox_cookie, str(place_id))
+        future = loop.create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((asset_id, future))
+
+        if len(batch) >= self.max_size:
+            self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = loop.call_later(self.window, self.flush, key)
+
+        return await future
+
+    def flush(self, key):
+        """Send whatever is pending for a key as one batch"""
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self.pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self.send_batch(key, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def send_batch(self, key, batch):
+        current_deadline.set(None)  # Shared by every waiter in the batch, whatever their deadlines
+        roblox_cookie, place_id = key
+        body_array = [
+            {"assetId": asset_id, "assetType": "Audio", "requestId": str(i)}
+            for i, (asset_id, _) in enumerate(batch)
+        ]
+        locations = {}
+
+        try:
+            # The batch POST only reads, so it is safe to retry when throttled
+            response = await roblox_request(
+                "POST", ASSET_BATCH_URL,
+                headers=roblox_asset_headers(place_id, roblox_cookie), json=body_array,
+                timeout=30, retry=True
+            )
+            if response.status_code == 200:
+                for obj in json_loads(response.content) or []:
+                    if obj.get("locations") and "location" in obj["locations"][0]:
+                        locations[str(obj.get("requestId"))] = obj["locations"][0]["location"]
+        except Exception as e:
+            print(f"Error fetching audio locations for {len(batch)} asset(s): {e}")
+
+        # Route each location back to its waiter by requestId
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(locations.get(str(i)))
+
+location_batcher = LocationBatcher(LOCATION_BATCH_SIZE, LOCATION_BATCH_WINDOW)
+
 async def fetch_audio_location(asset_id, place_id, roblox_cookie):
+    """Fetch the audio URL location, sharing lookups for the same asset and credentials"""
+    # Access is checked per cookie and place, so those are part of the key
+    key = (str(asset_id), str(place_id), roblox_cookie)
+    location = audio_location_cache.get(key)
+    if location is not CACHE_MISS:
+        return location
+    return await audio_location_flight.do(key, lambda: fetch_audio_location_uncached(asset_id, place_id, roblox_cookie))
+
+async def fetch_audio_location_uncached(asset_id, place_id, roblox_cookie):
+    """Fetch the audio URL location from Roblox API and remember it briefly"""
+    location = await query_audio_location(asset_id, place_id, roblox_cookie)
+    audio_location_cache.set((str(asset_id), str(place_id), roblox_cookie), location)
+    return location
+
+def prefetch_audio_locations(asset_ids, place_id, roblox_cookie):
+    """Start location lookups for a whole job at once so they share a batch request
+
+    Cached audio still needs its lookup, since that is the per-user access check.
+    """
+    for asset_id in asset_ids:
+        task = asyncio.ensure_future(fetch_audio_location(asset_id, place_id, roblox_cookie))
+        prefetch_tasks.add(task)
+        task.add_done_callback(prefetch_tasks.discard)
+
+async def query_audio_location(asset_id, place_id, roblox_cookie):
     """Fetch the audio URL location from Roblox API"""
     try:
         # Check if asset_id is numeric
@@ -53,46 +1107,23 @@ async def fetch_audio_location(asset_id, place_id, roblox_cookie):
         except ValueError:
             return None
 
-        body_array = [{
-            "assetId": asset_id,
-            "assetType": "Audio",
-            "requestId": "0"
-        }]
-
-        headers = {
-            "User-Agent": "Roblox/WinInet",
-            "Content-Type": "application/json",
-            "Cookie": f".ROBLOSECURITY={roblox_cookie}",
-            "Roblox-Place-Id": str(place_id),
-            "Accept": "*/*",
-            "Roblox-Browser-Asset-Request": "true"
-        }
-        
-        response = await asyncio.to_thread(
-            lambda: requests.post('https://assetdelivery.roblox.com/v2/assets/batch', 
-                                headers=headers, json=body_array, timeout=30)
-        )
+        location = await location_batcher.resolve(asset_id, place_id, roblox_cookie)
+        if location:
+            return location
 
-        if response.status_code == 200:
-            json_data = response.json()
-            
-            if not json_data or len(json_data) == 0:
-                return None
-                
-            obj = json_data[0]
-            if "locations" in obj and obj["locations"] and "location" in obj["locations"][0]:
-                return obj["locations"][0]["location"]
-            
-        # Try alternative asset delivery endpoint if the first one fails
-        alt_url = f"https://assetdelivery.roblox.com/v1/asset/?id={asset_id}"
-        alt_response = await asyncio.to_thread(
-            lambda: requests.get(alt_url, headers=headers, timeout=30)
-        )
-        
-        if alt_response.status_code == 200:
-            return alt_url
+        # Try alternative asset delivery endpoint if the batch had no location
+        alt_url = ASSET_V1_URL.format(asset_id=asset_id)
+        # Only the status matters here, so don't pull the audio body
+        async with roblox_stream(
+            "GET", alt_url, headers=roblox_asset_headers(place_id, roblox_cookie),
+            timeout=30, follow_redirects=True
+        ) as alt_response:
+            if alt_response.status_code == 200:
+                return alt_url
             
         return None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error fetching audio location: {e}")
         return None
@@ -103,110 +1134,1471 @@ def sanitize_filename(name):
     return sanitized_name.strip().replace(" ", "_")[:100]  # Limit length
 
 async def fetch_asset_details(asset_id):
-    """Get detailed asset information from Roblox API"""
+    """Get detailed asset information, served from the metadata cache when possible"""
+    key = str(asset_id)
+    asset_info = asset_details_cache.get(key)
+    if asset_info is not CACHE_MISS:
+        return asset_info
+    return await asset_details_flight.do(key, lambda: fetch_asset_details_uncached(key))
+
+async def fetch_asset_details_uncached(asset_id):
+    """Get detailed asset information from Roblox API and cache the result"""
+    asset_info = await query_asset_details(asset_id)
+    asset_details_cache.set(asset_id, asset_info)
+    return asset_info
+
+class EndpointHealth:
+    """Rolling latency and error rate for one endpoint, with a circuit breaker"""
+
+    def __init__(self, window, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.results = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, ok, latency):
+        self.results.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        tripped = self.consecutive_failures >= self.failure_threshold
+        if len(self.results) >= 10 and self.error_rate() >= 0.5:
+            tripped = True
+        if tripped:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def available(self):
+        """False while the breaker is open; afterwards the next call is a trial"""
+        return time.monotonic() >= self.open_until
+
+    def error_rate(self):
+        if not self.results:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def score(self):
+        """Sort key: measured endpoints by expected cost, then untried ones, then ones that have only failed"""
+        median = self.percentile(0.5)
+        if median is not None:
+            return (0, median * (1 + 4 * self.error_rate()))
+        if not self.results:
+            return (1, 0.0)
+        return (2, 0.0)
+
+DETAILS_ENDPOINTS = [
+    ("roproxy", "https://economy.roproxy.com/v2/assets/{asset_id}/details"),
+    ("economy", "https://economy.roblox.com/v2/assets/{asset_id}/details"),
+    ("productinfo", "https://api.roblox.com/marketplace/productinfo?assetId={asset_id}"),
+]
+
+@dataclasses.dataclass(slots=True)
+class AssetRecord:
+    """The asset details the bot uses, normalized across the details endpoints"""
+    name: str = None
+    description: str = None
+    creator_name: str = None
+    creator_id: int = None
+    created: str = None
+    updated: str = None
+    price: int = None
+    is_limited: bool = False
+    asset_type: str = None
+
+def details_field(data, name):
+    """A PascalCase field, falling back to the camelCase spelling some proxies return"""
+    value = data.get(name)
+    if value is None:
+        value = data.get(name[0].lower() + name[1:])
+    return value
+
+def asset_from_details(data):
+    """Adapter for the economy v2 /assets/{id}/details response (and its roproxy mirror)"""
+    creator = details_field(data, "Creator") or {}
+    return AssetRecord(
+        name=details_field(data, "Name"),
+        description=details_field(data, "Description"),
+        creator_name=details_field(creator, "Name"),
+        creator_id=details_field(creator, "Id"),
+        created=details_field(data, "Created"),
+        updated=details_field(data, "Updated"),
+        price=details_field(data, "PriceInRobux"),
+        is_limited=bool(details_field(data, "IsLimited")),
+        asset_type=details_field(data, "AssetType"),
+    )
+
+def asset_from_product_info(data):
+    """Adapter for the legacy marketplace/productinfo response"""
+    record = asset_from_details(data)
+    record.is_limited = record.is_limited or bool(data.get("IsLimitedUnique"))
+    return record
+
+DETAILS_ADAPTERS = {
+    "roproxy": asset_from_details,
+    "economy": asset_from_details,
+    "productinfo": asset_from_product_info,
+}
+
+details_health = {
+    name: EndpointHealth(ENDPOINT_HEALTH_WINDOW, ENDPOINT_FAILURE_THRESHOLD, ENDPOINT_COOLDOWN)
+    for name, _ in DETAILS_ENDPOINTS
+}
+
+def ordered_details_endpoints():
+    """Healthy endpoints, fastest first; if every breaker is open, try them all in default order"""
+    healthy = [endpoint for endpoint in DETAILS_ENDPOINTS if details_health[endpoint[0]].available()]
+    if not healthy:
+        return list(DETAILS_ENDPOINTS)
+    # Ties (untried or failure-only endpoints) keep their DETAILS_ENDPOINTS order
+    return sorted(healthy, key=lambda endpoint: (details_health[endpoint[0]].score(), DETAILS_ENDPOINTS.index(endpoint)))
+
+async def try_details_endpoint(endpoint, asset_id):
+    """Query one details endpoint, recording its health; returns an AssetRecord or None"""
+    name, url_template = endpoint
+    health = details_health[name]
+    started = time.monotonic()
     try:
-        # Try multiple API endpoints
-        apis = [
-            f"https://economy.roproxy.com/v2/assets/{asset_id}/details",
-            f"https://economy.roblox.com/v2/assets/{asset_id}/details",
-            f"https://api.roblox.com/marketplace/productinfo?assetId={asset_id}"
-        ]
+        # No retries here: the next endpoint is a better retry than this one
+        response = await roblox_request("GET", url_template.format(asset_id=asset_id), timeout=15, retry=False)
+    except DeadlineExceeded:
+        raise  # The caller ran out of time; that says nothing about the endpoint
+    except Exception:
+        health.record(False, time.monotonic() - started)
+        return None
         
-        for api_url in apis:
+    # 4xx means the host answered; only server errors and throttling count against it
+    health.record(response.status_code < 500 and response.status_code != 429, time.monotonic() - started)
+    if response.status_code != 200:
+        return None
+    try:
+        data = json_loads(response.content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return DETAILS_ADAPTERS.get(name, asset_from_details)(data)
+
+async def first_result(tasks):
+    """Return the first non-empty task result and cancel the rest"""
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result():
+                    return task.result()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def query_asset_details(asset_id):
+    """Query the Roblox details endpoints, healthiest first, until one answers"""
+    try:
+        endpoints = ordered_details_endpoints()
+        i = 0
+        while i < len(endpoints):
+            health = details_health[endpoints[i][0]]
+            first = asyncio.create_task(try_details_endpoint(endpoints[i], asset_id))
+            
+            # Hedge: if the first endpoint is slower than usual, race the next one against it
+            if HEDGE_ENABLED and i + 1 < len(endpoints) and len(health.latencies) >= 10:
+                hedge_after = health.percentile(HEDGE_PERCENTILE)
+                done, _ = await asyncio.wait({first}, timeout=hedge_after)
+                if not done:
+                    second = asyncio.create_task(try_details_endpoint(endpoints[i + 1], asset_id))
+                    asset_info = await first_result([first, second])
+                    if asset_info:
+                        return asset_info
+                    i += 2
+                    continue
+                    
+            asset_info = await first
+            if asset_info:
+                return asset_info
+            i += 1
+                
+        return None
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error fetching asset details: {e}")
+        return None
+
+def build_asset_embed(asset_info, asset_id):
+    """Create a Discord embed with asset information"""
+    embed = discord.Embed(
+        title=f"🎵 {asset_info.name or 'Unknown Audio'}",
+        color=discord.Color.blue(),
+        url=f"https://www.roblox.com/library/{asset_id}/"
+    )
+    
+    if asset_info.description is not None:
+        embed.description = asset_info.description[:200] + "..." if len(asset_info.description) > 200 else asset_info.description
+    
+    if asset_info.created:
+        embed.add_field(name="Created", value=format_timestamp(asset_info.created), inline=True)
+    if asset_info.updated:
+        embed.add_field(name="Updated", value=format_timestamp(asset_info.updated), inline=True)
+    
+    if asset_info.creator_name:
+        embed.add_field(
+            name="Creator", 
+            value=f"[{asset_info.creator_name}](https://www.roblox.com/users/{asset_info.creator_id or ''}/profile)",
+            inline=True
+        )
+    
+    if asset_info.price is not None:
+        embed.add_field(name="Price", value=f"🟢 {asset_info.price} Robux", inline=True)
+    elif asset_info.is_limited:
+        embed.add_field(name="Status", value="🔴 Limited Item", inline=True)
+    
+    if asset_info.asset_type:
+        embed.set_footer(text=f"Asset Type: {asset_info.asset_type} • ID: {asset_id}")
+    else:
+        embed.set_footer(text=f"ID: {asset_id}")
+    
+    return embed
+
+class EmbedFactory:
+    """Build embeds once and hand out cheap copies
+
+    Static embeds (help menus, fixed error replies) are built at startup and
+    sent as-is. Asset embeds are cached as payload dicts next to the metadata
+    they were formatted from, so repeat downloads skip the formatting work.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.static = {}
+        self.assets = TTLCache(max_entries, ttl, 0)
+
+    def add(self, name, embed):
+        self.static[name] = embed
+
+    def get(self, name):
+        """A prebuilt embed; callers must not modify it"""
+        return self.static[name]
+
+    def asset(self, asset_info, asset_id):
+        """A fresh asset embed, formatted at most once per version of its metadata"""
+        key = str(asset_id)
+        cached = self.assets.get(key)
+        if cached is CACHE_MISS or cached[0] != asset_info:
+            cached = (asset_info, build_asset_embed(asset_info, asset_id).to_dict())
+            self.assets.set(key, cached)
+        payload = cached[1]
+        # Embed.from_dict keeps the fields list, so give each copy its own for add_field
+        return discord.Embed.from_dict({**payload, "fields": list(payload.get("fields", ()))})
+
+embeds = EmbedFactory(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+
+async def create_asset_embed(asset_info, asset_id):
+    """Asset embed from the embed cache; safe to modify"""
+    return embeds.asset(asset_info, asset_id)
+
+def transcoding_available():
+    return TRANSCODE_ENABLED and FFMPEG_PATH is not None
+
+def download_limit():
+    """Largest file worth downloading: the upload limit, or more if it can be transcoded to fit"""
+    return max(AUDIO_MAX_BYTES, TRANSCODE_MAX_SOURCE_BYTES) if transcoding_available() else AUDIO_MAX_BYTES
+
+async def stream_audio_to_cache(asset_id, response):
+    """Write a streamed CDN response into the audio cache as chunks arrive"""
+    limit = download_limit()
+    too_large = f"Asset {asset_id} is larger than the {human_readable_size(limit)} " + (
+        "download limit" if limit > AUDIO_MAX_BYTES else "upload limit"
+    )
+    
+    # Reject oversized files before reading the body when the size is advertised
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        return None, too_large
+        
+    temp_path = audio_cache.temp_path()
+    digest = hashlib.sha256()
+    received = 0
+    write_time = 0.0
+    file_path = None
+    
+    try:
+        with open(temp_path, "wb") as f:
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                received += len(chunk)
+                if received > limit:
+                    return None, too_large
+                digest.update(chunk)
+                started = time.perf_counter()
+                f.write(chunk)
+                write_time += time.perf_counter() - started
+        started = time.perf_counter()
+        file_path = audio_cache.commit(asset_id, temp_path, digest.hexdigest())
+        metrics.observe("audio_stage_seconds", write_time + time.perf_counter() - started, stage="disk_write")
+        return file_path, None
+    finally:
+        metrics.inc("audio_bytes_downloaded_total", received)
+        if file_path is None:
+            audio_cache.remove_file(temp_path)
+
+class SegmentError(Exception):
+    """A byte-range request was not answered with the requested range"""
+
+def ranged_size(response):
+    """Size of the body if it is big enough and the CDN lets us fetch it in ranges, else None"""
+    size = response.headers.get("Content-Length", "")
+    if (
+        response.headers.get("Accept-Ranges", "").lower() != "bytes"
+        or response.headers.get("Content-Encoding", "identity") != "identity"
+        or not size.isdigit()
+        or not hasattr(os, "pwrite")
+    ):
+        return None
+    size = int(size)
+    return size if RANGED_DOWNLOAD_THRESHOLD <= size <= download_limit() else None
+
+async def write_range(response, fd, position, end):
+    """Write a response body at its file offset, stopping after byte end; returns the next offset"""
+    async for chunk in response.aiter_raw(DOWNLOAD_CHUNK_SIZE):
+        chunk = chunk[:end + 1 - position]
+        os.pwrite(fd, chunk, position)
+        position += len(chunk)
+        if position > end:
+            break
+    return position
+
+async def fetch_range(url, headers, fd, start, end, response=None):
+    """Fill bytes start..end of the file, resuming from the last written byte after a failure
+
+    response, if given, is an already open response whose body starts at start.
+    Returns the number of bytes received.
+    """
+    position = start
+    failures = 0
+    while position <= end:
+        before = position
+        try:
+            if response is not None:
+                try:
+                    position = await write_range(response, fd, position, end)
+                finally:
+                    await response.aclose()
+                    response = None
+            else:
+                async with roblox_stream(
+                    "GET", url, headers={**headers, "Range": f"bytes={position}-{end}"}, timeout=30
+                ) as segment:
+                    if segment.status_code != 206:
+                        raise SegmentError(f"HTTP {segment.status_code} for a byte range")
+                    position = await write_range(segment, fd, position, end)
+        except (httpx.HTTPError, SegmentError):
+            if failures >= RANGED_SEGMENT_RETRIES:
+                raise
+        else:
+            if position > end:
+                break
+            if position > before:
+                continue  # Short read: ask for the rest straight away
+            if failures >= RANGED_SEGMENT_RETRIES:
+                raise SegmentError("byte range request returned no data")
+        failures += 1
+        metrics.inc("audio_segment_retries_total")
+        await asyncio.sleep(backoff_delay(failures - 1))
+    return position - start
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 ** 2), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def download_ranges_to_cache(asset_id, headers, response, size):
+    """Fetch a large file as concurrent byte ranges into a preallocated temp file
+
+    The first segment is read from the already open response; the others are
+    separate Range requests. Returns (file_path, error).
+    """
+    url = str(response.url)  # Segments skip the redirect the first request followed
+    segments = [
+        (start, min(start + RANGED_SEGMENT_SIZE, size) - 1)
+        for start in range(0, size, RANGED_SEGMENT_SIZE)
+    ]
+    semaphore = asyncio.Semaphore(RANGED_CONNECTIONS)
+    temp_path = audio_cache.temp_path()
+    received = 0
+    file_path = None
+    
+    async def segment(index, start, end):
+        nonlocal received
+        async with semaphore:
+            received += await fetch_range(url, headers, fd, start, end, response if index == 0 else None)
+    
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            tasks = [asyncio.create_task(segment(i, start, end)) for i, (start, end) in enumerate(segments)]
             try:
-                response = await asyncio.to_thread(
-                    lambda: requests.get(api_url, timeout=15)
+                await asyncio.gather(*tasks)
+            except Exception as e:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                return None, f"Failed to download asset {asset_id}: {str(e) or type(e).__name__}"
+        finally:
+            os.close(fd)
+            await response.aclose()
+            
+        started = time.perf_counter()
+        digest = await asyncio.to_thread(hash_file, temp_path)
+        file_path = audio_cache.commit(asset_id, temp_path, digest)
+        metrics.observe("audio_stage_seconds", time.perf_counter() - started, stage="disk_write")
+        return file_path, None
+    finally:
+        metrics.inc("audio_bytes_downloaded_total", received)
+        if file_path is None:
+            audio_cache.remove_file(temp_path)
+
+async def fetch_audio_to_cache(asset_id, audio_url, roblox_cookie):
+    """Download an asset's audio into the cache; returns (file_path, failure reason, error)"""
+    headers = {
+        "User-Agent": "Roblox/WinInet",
+        "Cookie": f".ROBLOSECURITY={roblox_cookie}"
+    }
+    
+    async with roblox_stream(
+        "GET", audio_url, headers=headers, timeout=30, follow_redirects=True
+    ) as response:
+        if response.status_code != 200:
+            return None, "http_error", f"Failed to download asset {asset_id}: HTTP {response.status_code}"
+            
+        # Large files come down as parallel byte ranges when the CDN supports them
+        size = ranged_size(response)
+        if size:
+            file_path, error = await download_ranges_to_cache(asset_id, headers, response, size)
+            if error:
+                return None, "http_error", error
+            return file_path, None, None
+            
+        file_path, error = await stream_audio_to_cache(asset_id, response)
+        
+    if error:
+        return None, "too_large", error
+    return file_path, None, None
+
+transcode_slots = None
+
+def transcode_bitrate(duration, limit):
+    """Opus bitrate that fits duration seconds of audio into limit bytes, leaving room for container overhead"""
+    return min(TRANSCODE_MAX_BITRATE, int(limit * 8 * 0.9 / duration))
+
+async def run_ffmpeg(*args):
+    """Run ffmpeg in its own process; returns (exit code, stderr)"""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, "-hide_banner", "-nostdin", *args,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), TRANSCODE_TIMEOUT)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stderr.decode("utf-8", errors="replace")
+
+async def transcode_to_cache(asset_id, source_path):
+    """Re-encode an oversized file to Opus under the upload limit; returns (file_path, error)"""
+    global transcode_slots
+    if transcode_slots is None:
+        transcode_slots = asyncio.Semaphore(TRANSCODE_CONCURRENCY)
+    too_long = f"Asset {asset_id} is too long to fit under the {human_readable_size(AUDIO_MAX_BYTES)} upload limit"
+    
+    async with transcode_slots:
+        # Without an output file ffmpeg only reads the header, which is enough for the duration
+        _, info = await run_ffmpeg("-i", source_path)
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", info)
+        if not match:
+            return None, f"Could not read the audio length of asset {asset_id}"
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        bitrate = transcode_bitrate(max(duration, 1.0), AUDIO_MAX_BYTES)
+        if bitrate < TRANSCODE_MIN_BITRATE:
+            return None, too_long
+            
+        temp_path = audio_cache.temp_path()
+        file_path = None
+        try:
+            # Opus bitrates are approximate, so step down if the first try overshoots
+            for bitrate in (bitrate, int(bitrate * 0.8)):
+                if bitrate < TRANSCODE_MIN_BITRATE:
+                    break
+                started = time.perf_counter()
+                code, errors = await run_ffmpeg(
+                    "-v", "error", "-y", "-i", source_path, "-vn", "-map_metadata", "-1",
+                    "-c:a", "libopus", "-b:a", str(bitrate), "-f", "ogg", temp_path
                 )
-                if response.status_code == 200:
-                    asset_info = response.json()
-                    return asset_info
-            except Exception:
+                metrics.observe("audio_stage_seconds", time.perf_counter() - started, stage="transcode")
+                if code != 0:
+                    return None, f"Failed to transcode asset {asset_id}: {errors.strip()[-200:] or f'ffmpeg exited with {code}'}"
+                if os.path.getsize(temp_path) <= AUDIO_MAX_BYTES:
+                    digest = await asyncio.to_thread(hash_file, temp_path)
+                    file_path = audio_cache.commit(asset_id, temp_path, digest, suffix="-opus")
+                    return file_path, None
+            return None, too_long
+        finally:
+            if file_path is None:
+                audio_cache.remove_file(temp_path)
+
+async def fit_upload_limit(asset_id, file_path):
+    """Swap a file over the upload limit for its cached or freshly transcoded Opus copy"""
+    if os.path.getsize(file_path) <= AUDIO_MAX_BYTES:
+        return file_path, None
+    if not transcoding_available():
+        return None, f"Asset {asset_id} is larger than the {human_readable_size(AUDIO_MAX_BYTES)} upload limit"
+    return await audio_transcode_flight.do(
+        str(asset_id), lambda: transcode_to_cache(asset_id, file_path)
+    )
+
+async def download_audio_file(asset_id, place_id, roblox_cookie):
+    """Download a single audio file and return the file path and asset info"""
+    try:
+        # Each stage only gets what is left of the command's deadline
+        with time_stage("details"):
+            asset_info = await within_deadline(fetch_asset_details(asset_id))
+        if not asset_info:
+            record_download("failure", "details")
+            return None, None, f"Could not fetch information for asset {asset_id}"
+            
+        # The location lookup is what checks this user's cookie and place against Roblox,
+        # so it must pass before anything is served, even from the disk cache
+        with time_stage("location"):
+            audio_url = await within_deadline(fetch_audio_location(asset_id, place_id, roblox_cookie))
+        
+        if not audio_url:
+            record_download("failure", "location")
+            return None, None, f"Could not fetch audio URL for asset {asset_id}"
+            
+        # Serve repeat requests from the disk cache, preferring an upload-sized copy
+        file_path = audio_cache.lookup(f"{asset_id}-opus") or audio_cache.lookup(asset_id)
+        if file_path:
+            file_path, error = await within_deadline(fit_upload_limit(asset_id, file_path))
+            if error:
+                record_download("failure", "transcode")
+                return None, None, error
+            record_download("success", "cache")
+            return file_path, asset_info, None
+        
+        # The bytes are the same for everyone, so concurrent downloads of an asset share one transfer
+        with time_stage("transfer"):
+            file_path, reason, error = await within_deadline(audio_download_flight.do(
+                str(asset_id), lambda: fetch_audio_to_cache(asset_id, audio_url, roblox_cookie)
+            ))
+            
+        if error:
+            record_download("failure", reason)
+            return None, None, error
+            
+        file_path, error = await within_deadline(fit_upload_limit(asset_id, file_path))
+        if error:
+            record_download("failure", "transcode")
+            return None, None, error
+        record_download("success", "cdn")
+        return file_path, asset_info, None
+    except DeadlineExceeded:
+        record_download("failure", "deadline")
+        return None, None, f"Timed out downloading asset {asset_id}; the bot is busy, please try again later"
+    except Exception as e:
+        record_download("failure", "exception")
+        return None, None, f"Error downloading asset {asset_id}: {str(e)}"
+
+def format_duration(seconds):
+    """Short human readable duration, e.g. 1m 35s"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+class ProgressReporter:
+    """Edit a progress message at most once per interval, merging whatever changed in between"""
+
+    def __init__(self, message, total, interval, queue_status=None):
+        self.message = message
+        self.total = total
+        self.interval = interval
+        self.queue_status = queue_status
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_text = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def record(self, ok):
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def render(self):
+        done = self.completed + self.failed
+        queued, position = self.queue_status() if self.queue_status else (0, None)
+        in_flight = max(0, self.total - done - queued)
+        lines = [
+            f"🔍 **Downloading** ({done}/{self.total})",
+            f"✅ {self.completed} done • 🔄 {in_flight} in progress • ⏳ {queued} queued • ❌ {self.failed} failed"
+        ]
+        if position:
+            lines.append(f"Next asset is #{position} in the download queue")
+        if done and done < self.total:
+            remaining = (time.monotonic() - self.started) / done * (self.total - done)
+            # Round so the ETA alone doesn't force an edit every interval
+            lines.append(f"ETA: ~{format_duration(max(5, round(remaining / 5) * 5))}")
+        return "\n".join(lines)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        text = self.render()
+        if text == self.last_text:
+            return
+        self.last_text = text
+        try:
+            await self.message.edit(content=text)
+        except Exception as e:
+            print(f"Error updating progress message: {e}")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def finish(self, **final):
+        """Stop the periodic updates and always write the final state"""
+        await self.stop()
+        await self.message.edit(**final)
+
+def audio_filename(asset_info, asset_id):
+    """Attachment name for an asset's audio file"""
+    return f"{sanitize_filename(asset_info.name or f'audio_{asset_id}')}.ogg"
+
+async def asset_result_embed(asset_info, asset_id, file_size):
+    """Asset embed plus the per-download File Info field"""
+    embed = await create_asset_embed(asset_info, asset_id)
+    embed.add_field(
+        name="File Info",
+        value=f"Size: {human_readable_size(file_size)}\nFormat: OGG",
+        inline=False
+    )
+    return embed
+
+class AudioUploader:
+    """Send each downloaded file as its own message
+
+    add() and close() return (asset_id, error) pairs for the assets they
+    settled, with error None on success; they never raise for a failed send.
+    """
+
+    def __init__(self, send, pacer, content):
+        self.send = send
+        self.pacer = pacer
+        self.content = content
+
+    async def add(self, asset_id, file_path, asset_info):
+        file_size = os.path.getsize(file_path)
+        embed = await asset_result_embed(asset_info, asset_id, file_size)
+        try:
+            await self.pacer.wait()  # Rate limit protection
+            with open(file_path, "rb") as f, time_stage("upload"), count_upload(file_size):
+                await self.send(
+                    content=self.content,
+                    embed=embed,
+                    file=discord.File(f, filename=audio_filename(asset_info, asset_id))
+                )
+        except Exception as e:
+            return [(asset_id, str(e))]
+        return [(asset_id, None)]
+
+    async def close(self):
+        return []
+
+class BundleUploader(AudioUploader):
+    """Pack several files and embeds into each message, within Discord's per-message limits"""
+
+    def __init__(self, send, pacer, content):
+        super().__init__(send, pacer, content)
+        self.pending = []
+
+    async def add(self, asset_id, file_path, asset_info):
+        file_size = os.path.getsize(file_path)
+        embed = await asset_result_embed(asset_info, asset_id, file_size)
+        
+        results = []
+        if self.pending and (
+            len(self.pending) >= DISCORD_MAX_ATTACHMENTS
+            or sum(item[4] for item in self.pending) + file_size > AUDIO_MAX_BYTES
+            or sum(len(item[3]) for item in self.pending) + len(embed) > DISCORD_MAX_EMBED_CHARS
+        ):
+            results = await self.flush()
+        self.pending.append((asset_id, file_path, audio_filename(asset_info, asset_id), embed, file_size))
+        return results
+
+    async def flush(self):
+        items, self.pending = self.pending, []
+        if not items:
+            return []
+        total_size = sum(item[4] for item in items)
+        try:
+            await self.pacer.wait()  # Rate limit protection
+            with ExitStack() as stack, time_stage("upload"), count_upload(total_size):
+                files = [
+                    discord.File(stack.enter_context(open(file_path, "rb")), filename=filename)
+                    for _, file_path, filename, _, _ in items
+                ]
+                await self.send(
+                    content=f"{self.content} ({len(items)} files)",
+                    embeds=[item[3] for item in items],
+                    files=files
+                )
+        except Exception as e:
+            return [(item[0], str(e)) for item in items]
+        return [(item[0], None) for item in items]
+
+    async def close(self):
+        return await self.flush()
+
+class ZipUploader(AudioUploader):
+    """Stream files into a zip archive as they arrive, starting a new part whenever the next one wouldn't fit"""
+
+    def __init__(self, send, pacer, content):
+        super().__init__(send, pacer, content)
+        self.part = 0
+        self.fileobj = None
+        self.archive = None
+        self.members = []
+        self.directory_size = 0  # Central directory entries, only written at close()
+
+    async def add(self, asset_id, file_path, asset_info):
+        file_size = os.path.getsize(file_path)
+        name = audio_filename(asset_info, asset_id)
+        if any(member_name == name for _, member_name in self.members):
+            name = f"{name[:-4]}_{asset_id}.ogg"
+            
+        # Local header + central directory entry for this member; the end record is added once per part
+        member_size = 30 + 46 + 2 * len(name.encode()) + file_size
+        if member_size + 22 > AUDIO_MAX_BYTES:
+            # Too big for any archive under the limit, but it still fits as a plain attachment
+            return await super().add(asset_id, file_path, asset_info)
+            
+        results = []
+        if self.archive and self.fileobj.tell() + self.directory_size + member_size + 22 > AUDIO_MAX_BYTES:
+            results = await self.flush()
+        if not self.archive:
+            self.fileobj = tempfile.TemporaryFile()
+            # Audio is already compressed, so store it as-is
+            self.archive = zipfile.ZipFile(self.fileobj, "w", zipfile.ZIP_STORED)
+            
+        await asyncio.to_thread(self.archive.write, file_path, name)
+        self.members.append((asset_id, name))
+        self.directory_size += 46 + len(name.encode())
+        return results
+
+    async def flush(self):
+        if not self.archive:
+            return []
+        members, fileobj = self.members, self.fileobj
+        self.archive.close()
+        self.archive, self.fileobj, self.members = None, None, []
+        self.directory_size = 0
+        self.part += 1
+        
+        filename = "roblox_audio.zip" if self.part == 1 else f"roblox_audio_part{self.part}.zip"
+        try:
+            size = fileobj.tell()
+            fileobj.seek(0)
+            await self.pacer.wait()  # Rate limit protection
+            with time_stage("upload"), count_upload(size):
+                await self.send(
+                    content=f"{self.content} (📦 {len(members)} files, {human_readable_size(size)})",
+                    file=discord.File(fileobj, filename=filename)
+                )
+        except Exception as e:
+            return [(asset_id, str(e)) for asset_id, _ in members]
+        finally:
+            fileobj.close()
+        return [(asset_id, None) for asset_id, _ in members]
+
+    async def close(self):
+        return await self.flush()
+
+OUTPUT_MODES = {
+    "single": AudioUploader,
+    "bundle": BundleUploader,
+    "zip": ZipUploader,
+}
+
+def split_output_mode(args, default):
+    """Pull a --single/--bundle/--zip flag out of a command's arguments"""
+    mode = default
+    rest = []
+    for arg in args:
+        flag = arg.lower()
+        if flag.startswith("--") and flag[2:] in OUTPUT_MODES:
+            mode = flag[2:]
+        else:
+            rest.append(arg)
+    return mode, rest
+
+class QueueFull(Exception):
+    pass
+
+class DownloadQueue:
+    """Shared download queue served by a fixed worker pool, round-robin across users"""
+
+    def __init__(self, workers, per_user_limit):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.user_queues = OrderedDict()
+        self.available = None
+        self.tasks = []
+
+    def start(self):
+        """Start the worker pool (idempotent)"""
+        if self.tasks:
+            return
+        self.available = asyncio.Semaphore(0)
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, user_id, asset_ids, place_id, roblox_cookie, deadline=None):
+        """Queue assets for a user and return one future per asset, in order"""
+        self.start()
+        queue = self.user_queues.get(user_id)
+        queued = len(queue) if queue else 0
+        if len(asset_ids) > self.per_user_limit:
+            raise QueueFull(f"A single download can include at most {self.per_user_limit} IDs; this one has {len(asset_ids)}")
+        if queued + len(asset_ids) > self.per_user_limit:
+            raise QueueFull(f"You already have {queued} item(s) queued; the limit is {self.per_user_limit}")
+            
+        if not process_pool.processes:
+            # Worker processes keep their own location caches, so only prefetch in-process
+            prefetch_audio_locations(asset_ids, place_id, roblox_cookie)
+        loop = asyncio.get_running_loop()
+        queue = self.user_queues.setdefault(user_id, deque())
+        futures = []
+        for asset_id in asset_ids:
+            future = loop.create_future()
+            queue.append((asset_id, place_id, roblox_cookie, future, deadline))
+            futures.append(future)
+            self.available.release()
+        return futures
+
+    def cancel(self, futures):
+        """Drop unfinished items, e.g. when the command that queued them fails"""
+        pending = {id(future) for future in futures if not future.done()}
+        for future in futures:
+            future.cancel()
+        if not pending:
+            return
+        for user_id, queue in list(self.user_queues.items()):
+            kept = deque(item for item in queue if id(item[3]) not in pending)
+            if kept:
+                self.user_queues[user_id] = kept
+            else:
+                del self.user_queues[user_id]
+
+    def next_item(self):
+        """Take the next item, rotating through users so nobody is starved"""
+        if not self.user_queues:
+            return None
+        user_id, queue = next(iter(self.user_queues.items()))
+        item = queue.popleft()
+        if queue:
+            self.user_queues.move_to_end(user_id)
+        else:
+            del self.user_queues[user_id]
+        return item
+
+    def position(self, future):
+        """Estimated number of items served before this one, or None if it already left the queue"""
+        rotation = list(self.user_queues.values())
+        for user_index, queue in enumerate(rotation):
+            for index, item in enumerate(queue):
+                if item[3] is not future:
+                    continue
+                # Every user gets one item per round, in rotation order
+                ahead = 0
+                for other_index, other in enumerate(rotation):
+                    ahead += min(len(other), index + (1 if other_index < user_index else 0))
+                return ahead + 1
+        return None
+
+    def depth(self):
+        return sum(len(queue) for queue in self.user_queues.values())
+
+    def status(self, futures):
+        """How many of these futures are still queued, and the queue position of the earliest one"""
+        wanted = {id(future) for future in futures if not future.done()}
+        queued = 0
+        first = None
+        for queue in self.user_queues.values():
+            for item in queue:
+                if id(item[3]) in wanted:
+                    queued += 1
+                    first = first or item[3]
+        return queued, self.position(first) if first else None
+
+    async def worker(self):
+        while True:
+            await self.available.acquire()
+            item = self.next_item()
+            if item is None:
+                continue
+            asset_id, place_id, roblox_cookie, future, deadline = item
+            if future.done():
                 continue
+            if deadline and deadline.expired():
+                # Shed work whose command has already run out of time instead of starting it
+                record_download("failure", "deadline")
+                future.set_result((None, None, f"Timed out waiting in the queue for asset {asset_id}; please try again later"))
+                continue
+            current_deadline.set(deadline)
+            try:
+                result = await run_download(asset_id, place_id, roblox_cookie)
+            except Exception as e:
+                result = None, None, f"Error downloading asset {asset_id}: {str(e)}"
+            if not future.done():
+                future.set_result(result)
+
+# Keep every worker process busy, so throughput scales with DOWNLOAD_PROCESSES
+download_queue = DownloadQueue(DOWNLOAD_CONCURRENCY * max(1, DOWNLOAD_PROCESSES), MAX_QUEUED_PER_USER)
+
+def download_worker_main(requests, results, concurrency, in_flight):
+    """Entry point of a download worker process"""
+    audio_cache.owner = False
+    asyncio.run(download_worker_loop(requests, results, concurrency, in_flight))
+
+async def publish_in_flight(in_flight):
+    """Mirror this process's Roblox request count into shared memory for the bot's load shedding"""
+    while True:
+        in_flight.value = http_in_flight
+        await asyncio.sleep(0.25)
+
+async def download_worker_loop(requests, results, concurrency, in_flight):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    publisher = asyncio.create_task(publish_in_flight(in_flight))
+    
+    async def handle(job_id, asset_id, place_id, roblox_cookie, budget):
+        if budget is not None:
+            current_deadline.set(Deadline(budget))
+        try:
+            result = await download_audio_file(asset_id, place_id, roblox_cookie)
+        except Exception as e:
+            result = None, None, f"Error downloading asset {asset_id}: {str(e)}"
+        finally:
+            semaphore.release()
+        # Report every cache file this asset has here, including an oversized source kept
+        # next to its transcode, so the bot process can index them and enforce the size budget
+        cached = [audio_cache.entries[key][0] for key in (asset_id, f"{asset_id}-opus") if key in audio_cache.entries]
+        results.put((job_id, result, cached))
+    
+    try:
+        while True:
+            await semaphore.acquire()
+            job = await loop.run_in_executor(None, requests.get)
+            if job is None:
+                break
+            task = asyncio.create_task(handle(*job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        publisher.cancel()
+        await close_http_clients()
+
+class ProcessDownloadPool:
+    """Run downloads in worker processes, talking to them over multiprocessing queues
+
+    Each asset ID always goes to the same process, so that process's caches and
+    single-flight layers still de-duplicate work.
+    """
+
+    def __init__(self, processes, concurrency):
+        self.size = processes
+        self.concurrency = concurrency
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = []
+        self.requests = []
+        self.in_flight = []
+        self.results = None
+        self.pending = {}
+        self.job_ids = itertools.count()
+        self.loop = None
+        self.watchdog = None
+
+    def start(self):
+        if self.processes or self.size <= 0:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.results = self.context.Queue()
+        for index in range(self.size):
+            self.requests.append(self.context.Queue())
+            self.in_flight.append(None)
+            self.processes.append(self.spawn(index))
+        threading.Thread(target=self.read_results, name="download-results", daemon=True).start()
+        self.watchdog = asyncio.create_task(self.watch())
+        print(f"Started {self.size} download worker process(es)")
+
+    def spawn(self, index):
+        # A fresh counter per process, so a crashed worker's requests stop counting
+        self.in_flight[index] = self.context.RawValue("i", 0)
+        process = self.context.Process(
+            target=download_worker_main,
+            args=(self.requests[index], self.results, self.concurrency, self.in_flight[index]),
+            name=f"download-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def read_results(self):
+        """Hand results from the worker processes back to the event loop (runs in a thread)"""
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            job_id, result, cached = item
+            self.loop.call_soon_threadsafe(self.resolve, job_id, (result, cached))
+
+    def resolve(self, job_id, result):
+        _, future = self.pending.pop(job_id, (None, None))
+        if future and not future.done():
+            future.set_result(result)
+
+    async def watch(self):
+        """Restart dead worker processes and fail the jobs they were holding"""
+        while True:
+            await asyncio.sleep(5)
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                print(f"Download worker {index} exited with code {process.exitcode}; restarting")
+                self.requests[index] = self.context.Queue()
+                self.processes[index] = self.spawn(index)
+                for job_id, (job_index, _) in list(self.pending.items()):
+                    if job_index == index:
+                        self.resolve(job_id, ((None, None, "Download worker crashed, please try again"), []))
+
+    async def download(self, asset_id, place_id, roblox_cookie):
+        job_id = next(self.job_ids)
+        index = zlib.crc32(str(asset_id).encode()) % self.size
+        future = self.loop.create_future()
+        self.pending[job_id] = (index, future)
+        # Monotonic clocks differ between processes, so send the remaining budget rather than the deadline
+        deadline = current_deadline.get()
+        budget = deadline.remaining() if deadline else None
+        self.requests[index].put((job_id, str(asset_id), place_id, roblox_cookie, budget))
+        try:
+            result, cached = await future
+        finally:
+            self.pending.pop(job_id, None)
+        for path in cached:
+            audio_cache.adopt(path)
+        return result
+
+    async def stop(self):
+        if not self.processes:
+            return
+        if self.watchdog:
+            self.watchdog.cancel()
+        for queue in self.requests:
+            queue.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.processes = []
+        self.requests = []
+        self.in_flight = []
+
+    def requests_in_flight(self):
+        """Roblox requests the worker processes currently have in flight"""
+        return sum(counter.value for counter in self.in_flight)
+
+process_pool = ProcessDownloadPool(DOWNLOAD_PROCESSES, DOWNLOAD_CONCURRENCY)
+
+def requests_in_flight():
+    """Roblox requests in flight in this process and in any download worker processes"""
+    return http_in_flight + process_pool.requests_in_flight()
+
+async def run_download(asset_id, place_id, roblox_cookie):
+    """Download in a worker process when the pool is running, otherwise on this event loop"""
+    if process_pool.processes:
+        return await process_pool.download(asset_id, place_id, roblox_cookie)
+    return await download_audio_file(asset_id, place_id, roblox_cookie)
+
+metrics.gauge("download_queue_depth", download_queue.depth, "Assets waiting in the download queue")
+metrics.gauge("download_queue_users", lambda: len(download_queue.user_queues), "Users with queued assets")
+metrics.gauge("roblox_requests_in_flight", requests_in_flight, "Roblox HTTP requests currently in flight")
+metrics.gauge("audio_cache_bytes", lambda: audio_cache.total_bytes, "Bytes held in the on-disk audio cache")
+metrics.gauge("audio_cache_files", lambda: len(audio_cache.entries), "Files held in the on-disk audio cache")
+metrics.gauge(
+    "metadata_cache",
+    lambda: {(("stat", key),): value for key, value in asset_details_cache.stats().items()},
+    "Asset metadata cache size and hit/miss/eviction counters"
+)
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass  # Scrapes every few seconds would flood the console
+
+def start_metrics_server(loop):
+    """Serve /metrics from a background thread; the numbers are read on the bot's event loop"""
+    if not METRICS_PORT:
+        return
+        
+    app = Flask("metrics")
+    
+    async def render():
+        return metrics.render()
+    
+    @app.route("/metrics")
+    def metrics_endpoint():
+        body = asyncio.run_coroutine_threadsafe(render(), loop).result(timeout=5)
+        return Response(body, mimetype="text/plain; version=0.0.4")
+        
+    try:
+        server = make_server(METRICS_HOST, METRICS_PORT, app, threaded=True, request_handler=QuietRequestHandler)
+    except OSError as e:
+        print(f"Failed to start metrics server: {e}")
+        return
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+async def run_download_job(user_id, asset_ids, place_id, roblox_cookie, mode, send, progress_msg, content, job=None):
+    """Queue a batch of assets, deliver them in input order and report the results on progress_msg
+
+    job is a journal entry when resuming an interrupted job; asset_ids are then
+    only the assets it had not settled yet.
+    """
+    successful = []
+    failed = []
+    resumed = 0
+    if job:
+        for settled_id, error in job["settled"].items():
+            if error:
+                failed.append(f"❌ `{settled_id}`: {error}")
+            else:
+                resumed += 1
+    
+    # Workers fetch details, locations and audio concurrently; upload in input order
+    try:
+        deadline = Deadline(DOWNLOAD_DEADLINE + DOWNLOAD_DEADLINE_PER_ASSET * len(asset_ids))
+        futures = download_queue.submit(user_id, asset_ids, place_id, roblox_cookie, deadline)
+    except QueueFull as e:
+        embed = discord.Embed(
+            title="❌ Queue Full",
+            description=f"{e}\nWait for your current downloads to finish and try again.",
+            color=discord.Color.red()
+        )
+        await progress_msg.edit(content=None, embed=embed)
+        return
+        
+    if job is None:
+        job = journal.open_job(user_id, asset_ids, place_id, mode, content, progress_msg)
+    uploader = OUTPUT_MODES.get(mode, AudioUploader)(send, UploadPacer(UPLOAD_INTERVAL), content)
+    progress = ProgressReporter(progress_msg, len(asset_ids), PROGRESS_INTERVAL, lambda: download_queue.status(futures))
+    progress.start()
+    
+    def settle(results):
+        for settled_id, error in results:
+            journal.record(job, settled_id, error)
+            if error:
+                failed.append(f"❌ `{settled_id}`: {error}")
+            else:
+                successful.append(settled_id)
+            progress.record(error is None)
+    
+    try:
+        for asset_id, future in zip(asset_ids, futures):
+            try:
+                file_path, asset_info, error = await future
                 
-        return None
+                if error:
+                    settle([(asset_id, error)])
+                    continue
+                    
+                settle(await uploader.add(asset_id, file_path, asset_info))
+                
+            except Exception as e:
+                settle([(asset_id, str(e))])
+        settle(await uploader.close())
+        journal.close_job(job)
+    finally:
+        download_queue.cancel(futures)
+        await progress.stop()
+    
+    # Create result embed
+    result_embed = discord.Embed(
+        title="📊 Download Results",
+        color=discord.Color.blue()
+    )
+    summary = f"✅ **Success:** {len(successful) + resumed}\n❌ **Failed:** {len(failed)}"
+    if resumed:
+        summary += f"\n⏩ **Delivered before the restart:** {resumed}"
+    result_embed.add_field(name="Summary", value=summary, inline=False)
+    
+    if failed:
+        failures_text = "\n".join(failed[:5])  # Show first 5 failures
+        if len(failed) > 5:
+            failures_text += f"\n...and {len(failed) - 5} more"
+        result_embed.add_field(
+            name="Failed Downloads",
+            value=failures_text,
+            inline=False
+        )
+    
+    await progress.finish(content=None, embed=result_embed)
+
+def overloaded():
+    """Whether to turn new download commands away, so queued work keeps a bounded latency"""
+    if download_queue.depth() >= BUSY_QUEUE_DEPTH:
+        reason = "queue_depth"
+    elif requests_in_flight() >= BUSY_IN_FLIGHT:
+        reason = "in_flight"
+    else:
+        return False
+    metrics.inc("download_commands_rejected_total", reason=reason)
+    return True
+
+resume_tasks = set()
+
+async def job_channel(job):
+    """The channel a journaled job reported to, or the user's DMs if it's gone"""
+    try:
+        return bot.get_channel(job["channel_id"]) or await bot.fetch_channel(job["channel_id"])
+    except discord.HTTPException:
+        user = await bot.fetch_user(int(job["user_id"]))
+        return user.dm_channel or await user.create_dm()
+
+async def announce_interrupted_jobs():
+    """Tell users on their old progress messages how to resume jobs a restart interrupted"""
+    for jobs in list(journal.incomplete.values()):
+        for job in jobs:
+            remaining = len(job["asset_ids"]) - len(job["settled"])
+            try:
+                channel = await job_channel(job)
+                await channel.get_partial_message(job["message_id"]).edit(
+                    content=f"⏸️ **Download Interrupted**\nThe bot restarted with {remaining} file(s) left. "
+                            "Set your cookie again with `!setcookie` or `/setcookie` in DMs to resume.",
+                    embed=None
+                )
+            except Exception as e:
+                print(f"Could not update interrupted job {job['job_id']}: {e}")
+
+def resume_jobs(user_id):
+    """Resume a user's interrupted jobs now that their cookie is known again; returns how many"""
+    jobs = journal.take_incomplete(user_id)
+    for job in jobs:
+        task = asyncio.create_task(resume_job(job))
+        resume_tasks.add(task)
+        task.add_done_callback(resume_tasks.discard)
+    return len(jobs)
+
+async def resume_job(job):
+    remaining = [asset_id for asset_id in job["asset_ids"] if asset_id not in job["settled"]]
+    try:
+        channel = await job_channel(job)
+        text = f"⏳ **Resuming Download**\nProcessing the remaining {len(remaining)} audio files..."
+        try:
+            progress_msg = channel.get_partial_message(job["message_id"])
+            await progress_msg.edit(content=text, embed=None)
+        except discord.HTTPException:
+            progress_msg = await channel.send(text)
+        await run_download_job(
+            job["user_id"], remaining, job["place_id"], user_data[job["user_id"]]["cookie"], job["mode"],
+            channel.send, progress_msg, job["content"], job=job
+        )
     except Exception as e:
-        print(f"Error fetching asset details: {e}")
-        return None
+        print(f"Error resuming job {job['job_id']}: {e}")
 
-async def create_asset_embed(asset_info, asset_id):
-    """Create a Discord embed with asset information"""
+def parse_asset_ids(text):
+    """Split a list of IDs on whitespace, commas or semicolons; returns (unique valid IDs, invalid tokens)"""
+    valid = []
+    invalid = []
+    seen = set()
+    for token in re.split(r"[\s,;]+", text):
+        token = token.strip().strip('"\'')
+        if not token:
+            continue
+        if not token.isdigit():
+            invalid.append(token)
+        elif token not in seen:
+            seen.add(token)
+            valid.append(token)
+    return valid, invalid
+
+def parse_id_file(text):
+    """Asset IDs from a .txt or .csv file, in order and without repeats
+
+    Only cells made up entirely of numbers count, so CSV headers and name
+    columns like "Track 2" are ignored. A cell may hold several IDs
+    separated by spaces, as in a plain text list.
+    """
+    ids = []
+    for row in csv.reader(text.splitlines()):
+        for cell in row:
+            tokens = re.split(r"[\s;]+", cell.strip())
+            if all(token.isdigit() for token in tokens):
+                ids.extend(tokens)
+    return list(dict.fromkeys(ids))
+
+def error_embed(title, description):
+    return discord.Embed(title=title, description=description, color=discord.Color.red())
+
+def too_many_ids_embed(count):
+    return error_embed(
+        "❌ Too Many Asset IDs",
+        f"You can download at most {download_queue.per_user_limit} assets per command, but asked for {count}.\n"
+        "Split the list across several commands."
+    )
+
+def help_embed(auth, audio, utility):
     embed = discord.Embed(
-        title=f"🎵 {asset_info.get('Name', asset_info.get('name', 'Unknown Audio'))}",
-        color=discord.Color.blue(),
-        url=f"https://www.roblox.com/library/{asset_id}/"
+        title="🤖 Roblox Audio Downloader Help",
+        description="All available commands for the bot",
+        color=discord.Color.blue()
     )
+    embed.add_field(name="🔐 Authentication", value=auth, inline=False)
+    embed.add_field(name="🎵 Audio Commands", value=audio, inline=False)
+    embed.add_field(name="🛠️ Utility", value=utility, inline=False)
+    embed.set_footer(text="For security, always use cookie-related commands in DMs")
+    return embed
+
+def cookie_set_embed(in_dm_note):
+    embed = discord.Embed(
+        title="✅ Cookie Set Successfully",
+        description="Your Roblox cookie has been securely stored.",
+        color=discord.Color.green()
+    )
+    embed.add_field(
+        name="Important Security Note",
+        value="• Never share your cookie with anyone\n• If you suspect it's compromised, regenerate it immediately" + in_dm_note,
+        inline=False
+    )
+    return embed
+
+def build_static_embeds():
+    """Build the replies that never change once, at startup"""
+    embeds.add("help", help_embed(
+        "• `!setcookie [cookie]` - Set your Roblox cookie (DM only)\n• `!setplaceid [place_id]` - Set the Roblox place ID\n• `!setmode [single|bundle|zip]` - Set your default delivery mode",
+        "• `!download [asset_ids...]` - Download multiple audio files\nExample: `!download 12345 67890`\n• Add `--bundle` to pack files into fewer messages, or `--zip` for a single archive",
+        "• `!commands` - Show this help menu"
+    ))
+    embeds.add("slash_help", help_embed(
+        "• `/setcookie [cookie]` - Set your Roblox cookie (DM only)\n• `/setplaceid [place_id]` - Set the Roblox place ID\n• `/setmode [mode]` - Set your default delivery mode",
+        "• `/download [asset_ids] [ids_file] [mode]` - Download one or more audio files\nSeparate IDs with spaces or commas, or attach a .txt/.csv file",
+        "• `/commands` - Show this help menu"
+    ))
     
-    if 'Description' in asset_info:
-        embed.description = asset_info['Description'][:200] + "..." if len(asset_info['Description']) > 200 else asset_info['Description']
-    
-    if 'Created' in asset_info:
-        embed.add_field(name="Created", value=format_timestamp(asset_info['Created']), inline=True)
-    if 'Updated' in asset_info:
-        embed.add_field(name="Updated", value=format_timestamp(asset_info['Updated']), inline=True)
-    
-    if 'Creator' in asset_info:
-        creator = asset_info['Creator']
-        if creator and 'Name' in creator:
-            embed.add_field(
-                name="Creator", 
-                value=f"[{creator['Name']}](https://www.roblox.com/users/{creator.get('Id', '')}/profile)",
-                inline=True
-            )
-    
-    if 'PriceInRobux' in asset_info and asset_info['PriceInRobux'] is not None:
-        embed.add_field(name="Price", value=f"🟢 {asset_info['PriceInRobux']} Robux", inline=True)
-    elif 'IsLimited' in asset_info and asset_info['IsLimited']:
-        embed.add_field(name="Status", value="🔴 Limited Item", inline=True)
-    
-    if 'AssetType' in asset_info:
-        embed.set_footer(text=f"Asset Type: {asset_info['AssetType']} • ID: {asset_id}")
-    else:
-        embed.set_footer(text=f"ID: {asset_id}")
+    embed = cookie_set_embed("\n• Use this bot only in DMs")
+    embed.set_footer(text="Your cookie is stored only in memory and will be lost when the bot restarts")
+    embeds.add("cookie_set", embed)
+    embeds.add("slash_cookie_set", cookie_set_embed(""))
+    embeds.add("slash_dm_only", discord.Embed(
+        title="🔒 Security Notice",
+        description="For your account's safety, please only set your cookie in DMs with me!",
+        color=discord.Color.red()
+    ))
     
-    return embed
+    embeds.add("missing_place_id", error_embed("❌ Missing Place ID", "Please provide a valid Roblox place ID:\n`!setplaceid YOUR_PLACE_ID`"))
+    embeds.add("invalid_place_id", error_embed("❌ Invalid Place ID", "The place ID must be a numeric value."))
+    embeds.add("invalid_mode", error_embed("❌ Invalid Mode", "Choose one of: `single`, `bundle`, `zip`\n`!setmode bundle`"))
+    for prefix in ("!", "/"):
+        name = "slash_" if prefix == "/" else ""
+        embeds.add(name + "cookie_not_set", error_embed("❌ Cookie Not Set", f"You need to set your Roblox cookie first!\nUse `{prefix}setcookie` in DMs."))
+        embeds.add(name + "place_not_set", error_embed("❌ Place ID Not Set", f"You need to set a Place ID first!\nUse `{prefix}setplaceid YOUR_PLACE_ID`."))
+    embeds.add("missing_ids", error_embed("❌ Missing Asset IDs", "Please provide at least one asset ID:\n`!download [--bundle|--zip] ASSET_ID1 ASSET_ID2 ...`"))
+    embeds.add("slash_missing_ids", error_embed("❌ Missing Asset IDs", "Provide at least one numeric asset ID in `asset_ids` or attach a .txt/.csv file of IDs."))
+    embeds.add("busy", error_embed("⏳ Busy", "The bot is handling a lot of downloads right now. Please try again in a minute."))
+    embeds.add("id_file_too_large", error_embed("❌ File Too Large", f"The ID file must be under {human_readable_size(MAX_ID_FILE_BYTES)}."))
 
-async def download_audio_file(asset_id, place_id, roblox_cookie):
-    """Download a single audio file and return the file path and asset info"""
-    try:
-        asset_info = await fetch_asset_details(asset_id)
-        if not asset_info:
-            return None, None, f"Could not fetch information for asset {asset_id}"
-            
-        asset_name = asset_info.get('Name', asset_info.get('name', f'UnknownAsset_{asset_id}'))
-        sanitized_asset_name = sanitize_filename(asset_name)
-        audio_url = await fetch_audio_location(asset_id, place_id, roblox_cookie)
-        
-        if not audio_url:
-            return None, None, f"Could not fetch audio URL for asset {asset_id}"
-        
-        headers = {
-            "User-Agent": "Roblox/WinInet",
-            "Cookie": f".ROBLOSECURITY={roblox_cookie}"
-        }
-        
-        response = await asyncio.to_thread(
-            lambda: requests.get(audio_url, headers=headers, timeout=30)
-        )
-        
-        if response.status_code != 200:
-            return None, None, f"Failed to download asset {asset_id}: HTTP {response.status_code}"
-            
-        os.makedirs("audio_files", exist_ok=True)
-        file_path = os.path.join("audio_files", f"{sanitized_asset_name}.ogg")
-        
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-            
-        return file_path, asset_info, None
-    except Exception as e:
-        return None, None, f"Error downloading asset {asset_id}: {str(e)}"
+build_static_embeds()
+
+def command_tree_fingerprint():
+    """Hash of every slash command's name, description and parameter schema"""
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands(force=False):
+    """Sync slash commands with Discord only when the tree changed since the last sync; returns the synced count or None"""
+    async with bot.sync_lock:
+        fingerprint = command_tree_fingerprint()
+        if not force and fingerprint == await asyncio.to_thread(settings.get_state, "command_tree_fingerprint"):
+            metrics.inc("command_syncs_total", result="skipped")
+            return None
+        try:
+            synced = await bot.tree.sync()
+        except Exception:
+            metrics.inc("command_syncs_total", result="error")
+            raise
+        await asyncio.to_thread(settings.set_state, "command_tree_fingerprint", fingerprint)
+        metrics.inc("command_syncs_total", result="synced")
+        return len(synced)
+
+def record_ready():
+    """Record how long the bot took to become ready after starting or losing its connection"""
+    if bot.unready_since is None:
+        return
+    elapsed = time.monotonic() - bot.unready_since
+    kind = "reconnect" if bot.was_ready else "cold_start"
+    bot.unready_since = None
+    bot.was_ready = True
+    metrics.observe("bot_ready_seconds", elapsed, kind=kind)
+    print(f"Ready after {elapsed:.2f}s ({kind.replace('_', ' ')})")
 
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user.name} (ID: {bot.user.id})')
+    if not bot.was_ready:
+        task = asyncio.create_task(announce_interrupted_jobs())
+        resume_tasks.add(task)
+        task.add_done_callback(resume_tasks.discard)
+    # on_ready fires again after reconnects; only the first one after a tree change needs a sync
     try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+        synced = await sync_commands()
+        if synced is None:
+            print("Command tree unchanged, skipped sync")
+        else:
+            print(f"Synced {synced} command(s)")
     except Exception as e:
         print(f"Failed to sync commands: {e}")
     
@@ -217,8 +2609,36 @@ async def on_ready():
         details="Downloading audio files"
     )
     await bot.change_presence(activity=activity)
+    record_ready()
     print('------')
 
+@bot.event
+async def on_disconnect():
+    if bot.unready_since is None:
+        bot.unready_since = time.monotonic()
+
+@bot.event
+async def on_resumed():
+    record_ready()
+
+@bot.command(name="synccommands")
+@commands.is_owner()
+async def force_sync_commands(ctx):
+    """Force a slash command sync (bot owner only)"""
+    try:
+        synced = await sync_commands(force=True)
+    except Exception as e:
+        await ctx.send(f"❌ **Sync Failed**\n{e}")
+        return
+    await ctx.send(f"✅ Synced {synced} command(s)")
+
+@force_sync_commands.error
+async def force_sync_commands_error(ctx, error):
+    if isinstance(error, commands.NotOwner):
+        await ctx.send("❌ Only the bot owner can sync commands.")
+        return
+    raise error
+
 @bot.command(name="setcookie")
 async def set_cookie(ctx, cookie=None):
     """Set your Roblox cookie (DM only for security)"""
@@ -236,52 +2656,29 @@ async def set_cookie(ctx, cookie=None):
         return
         
     user_id = str(ctx.author.id)
-    if user_id not in user_data:
-        user_data[user_id] = {}
-    user_data[user_id]["cookie"] = cookie
-    
-    embed = discord.Embed(
-        title="✅ Cookie Set Successfully",
-        description="Your Roblox cookie has been securely stored.",
-        color=discord.Color.green()
-    )
-    embed.add_field(
-        name="Important Security Note",
-        value="• Never share your cookie with anyone\n• If you suspect it's compromised, regenerate it immediately\n• Use this bot only in DMs",
-        inline=False
-    )
-    embed.set_footer(text="Your cookie is stored only in memory and will be lost when the bot restarts")
+    user_data.setdefault(user_id, {})["cookie"] = cookie
+    await ctx.send(embed=embeds.get("cookie_set"))
     
-    await ctx.send(embed=embed)
+    resumed = resume_jobs(user_id)
+    if resumed:
+        await ctx.send(f"⏩ Resuming {resumed} download job(s) interrupted by a restart.")
 
 @bot.command(name="setplaceid")
 async def set_place_id(ctx, place_id=None):
     """Set the Roblox place ID for audio downloads"""
     if not place_id:
-        embed = discord.Embed(
-            title="❌ Missing Place ID",
-            description="Please provide a valid Roblox place ID:\n`!setplaceid YOUR_PLACE_ID`",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+        await ctx.send(embed=embeds.get("missing_place_id"))
         return
         
     try:
         # Simple validation
         int(place_id)
     except ValueError:
-        embed = discord.Embed(
-            title="❌ Invalid Place ID",
-            description="The place ID must be a numeric value.",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+        await ctx.send(embed=embeds.get("invalid_place_id"))
         return
         
     user_id = str(ctx.author.id)
-    if user_id not in user_data:
-        user_data[user_id] = {}
-    user_data[user_id]["place_id"] = place_id
+    settings.set(user_id, place_id=place_id)
     
     embed = discord.Embed(
         title="✅ Place ID Set",
@@ -295,171 +2692,77 @@ async def set_place_id(ctx, place_id=None):
     )
     await ctx.send(embed=embed)
 
+@bot.command(name="setmode")
+async def set_output_mode(ctx, mode=None):
+    """Set how your downloads are delivered by default"""
+    if not mode or mode.lower() not in OUTPUT_MODES:
+        await ctx.send(embed=embeds.get("invalid_mode"))
+        return
+        
+    settings.set(str(ctx.author.id), output_mode=mode.lower())
+    embed = discord.Embed(
+        title="✅ Output Mode Set",
+        description=f"Your downloads will now use `{mode.lower()}` mode by default.",
+        color=discord.Color.green()
+    )
+    await ctx.send(embed=embed)
+
 @bot.command(name="download")
 async def download_audio(ctx, *asset_ids):
     """Download multiple audio files from Roblox"""
     user_id = str(ctx.author.id)
+    mode, asset_ids = split_output_mode(asset_ids, settings.get(user_id, "output_mode", DEFAULT_OUTPUT_MODE))
+    asset_ids = list(dict.fromkeys(asset_ids))  # Repeated IDs are only fetched and sent once
     
     if user_id not in user_data or "cookie" not in user_data[user_id]:
-        embed = discord.Embed(
-            title="❌ Cookie Not Set",
-            description="You need to set your Roblox cookie first!\nUse `!setcookie` in DMs.",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+        await ctx.send(embed=embeds.get("cookie_not_set"))
         return
         
-    if user_id not in user_data or "place_id" not in user_data[user_id]:
-        embed = discord.Embed(
-            title="❌ Place ID Not Set",
-            description="You need to set a Place ID first!\nUse `!setplaceid YOUR_PLACE_ID`.",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+    if not settings.get(user_id, "place_id"):
+        await ctx.send(embed=embeds.get("place_not_set"))
         return
     
     if not asset_ids:
-        embed = discord.Embed(
-            title="❌ Missing Asset IDs",
-            description="Please provide at least one asset ID:\n`!download ASSET_ID1 ASSET_ID2 ...`",
-            color=discord.Color.red()
-        )
-        await ctx.send(embed=embed)
+        await ctx.send(embed=embeds.get("missing_ids"))
+        return
+        
+    if len(asset_ids) > download_queue.per_user_limit:
+        await ctx.send(embed=too_many_ids_embed(len(asset_ids)))
+        return
+    
+    if overloaded():
+        await ctx.send(embed=embeds.get("busy"))
         return
     
     roblox_cookie = user_data[user_id]["cookie"]
-    place_id = user_data[user_id]["place_id"]
+    place_id = settings.get(user_id, "place_id")
     
     progress_msg = await ctx.send(f"⏳ **Starting Download**\nProcessing {len(asset_ids)} audio files...")
-    
-    successful = []
-    failed = []
-    
-    for i, asset_id in enumerate(asset_ids, 1):
-        try:
-            await progress_msg.edit(content=f"🔍 **Downloading** ({i}/{len(asset_ids)})\nProcessing asset `{asset_id}`...")
-            file_path, asset_info, error = await download_audio_file(asset_id, place_id, roblox_cookie)
-            
-            if error:
-                failed.append(f"❌ `{asset_id}`: {error}")
-                continue
-                
-            # Get file size
-            file_size = os.path.getsize(file_path)
-            
-            # Create embed with asset info
-            embed = await create_asset_embed(asset_info, asset_id)
-            embed.add_field(
-                name="File Info",
-                value=f"Size: {human_readable_size(file_size)}\nFormat: OGG",
-                inline=False
-            )
-            
-            with open(file_path, "rb") as f:
-                await ctx.send(
-                    content=f"✅ Successfully downloaded audio!",
-                    embed=embed,
-                    file=discord.File(f, filename=f"{sanitize_filename(asset_info.get('Name', asset_info.get('name', f'audio_{asset_id}')))}.ogg")
-                )
-            
-            successful.append(asset_id)
-            await asyncio.sleep(1)  # Rate limit protection
-            
-        except Exception as e:
-            failed.append(f"❌ `{asset_id}`: {str(e)}")
-    
-    # Create result embed
-    result_embed = discord.Embed(
-        title="📊 Download Results",
-        color=discord.Color.blue()
-    )
-    result_embed.add_field(
-        name="Summary",
-        value=f"✅ **Success:** {len(successful)}\n❌ **Failed:** {len(failed)}",
-        inline=False
+    await run_download_job(
+        user_id, asset_ids, place_id, roblox_cookie, mode,
+        ctx.send, progress_msg, "✅ Successfully downloaded audio!"
     )
-    
-    if failed:
-        failures_text = "\n".join(failed[:5])  # Show first 5 failures
-        if len(failed) > 5:
-            failures_text += f"\n...and {len(failed) - 5} more"
-        result_embed.add_field(
-            name="Failed Downloads",
-            value=failures_text,
-            inline=False
-        )
-    
-    await progress_msg.edit(content=None, embed=result_embed)
-    
-    # Cleanup
-    if os.path.exists("audio_files"):
-        for file in os.listdir("audio_files"):
-            try:
-                os.remove(os.path.join("audio_files", file))
-            except:
-                pass
 
 @bot.command(name="commands")
 async def commands_help(ctx):
     """Show available commands"""
-    embed = discord.Embed(
-        title="🤖 Roblox Audio Downloader Help",
-        description="All available commands for the bot",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(
-        name="🔐 Authentication",
-        value="• `!setcookie [cookie]` - Set your Roblox cookie (DM only)\n• `!setplaceid [place_id]` - Set the Roblox place ID",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="🎵 Audio Commands",
-        value="• `!download [asset_ids...]` - Download multiple audio files\nExample: `!download 12345 67890`",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="🛠️ Utility",
-        value="• `!commands` - Show this help menu",
-        inline=False
-    )
-    
-    embed.set_footer(text="For security, always use cookie-related commands in DMs")
-    
-    await ctx.send(embed=embed)
+    await ctx.send(embed=embeds.get("help"))
 
 # Slash Commands
 @bot.tree.command(name="setcookie", description="Set your Roblox cookie (DM only for security)")
 @app_commands.describe(cookie="Your Roblox .ROBLOSECURITY cookie")
 async def slash_set_cookie(interaction: discord.Interaction, cookie: str):
     if not isinstance(interaction.channel, discord.DMChannel):
-        embed = discord.Embed(
-            title="🔒 Security Notice",
-            description="For your account's safety, please only set your cookie in DMs with me!",
-            color=discord.Color.red()
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embeds.get("slash_dm_only"), ephemeral=True)
         return
         
     user_id = str(interaction.user.id)
-    if user_id not in user_data:
-        user_data[user_id] = {}
-    user_data[user_id]["cookie"] = cookie
-    
-    embed = discord.Embed(
-        title="✅ Cookie Set Successfully",
-        description="Your Roblox cookie has been securely stored.",
-        color=discord.Color.green()
-    )
-    embed.add_field(
-        name="Important Security Note",
-        value="• Never share your cookie with anyone\n• If you suspect it's compromised, regenerate it immediately",
-        inline=False
-    )
+    user_data.setdefault(user_id, {})["cookie"] = cookie
+    await interaction.response.send_message(embed=embeds.get("slash_cookie_set"), ephemeral=True)
     
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    resumed = resume_jobs(user_id)
+    if resumed:
+        await interaction.followup.send(f"⏩ Resuming {resumed} download job(s) interrupted by a restart.", ephemeral=True)
 
 @bot.tree.command(name="setplaceid", description="Set the Roblox place ID for audio downloads")
 @app_commands.describe(place_id="The numeric Roblox place ID")
@@ -468,18 +2771,11 @@ async def slash_set_place_id(interaction: discord.Interaction, place_id: str):
         # Simple validation
         int(place_id)
     except ValueError:
-        embed = discord.Embed(
-            title="❌ Invalid Place ID",
-            description="The place ID must be a numeric value.",
-            color=discord.Color.red()
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embeds.get("invalid_place_id"), ephemeral=True)
         return
         
     user_id = str(interaction.user.id)
-    if user_id not in user_data:
-        user_data[user_id] = {}
-    user_data[user_id]["place_id"] = place_id
+    settings.set(user_id, place_id=place_id)
     
     embed = discord.Embed(
         title="✅ Place ID Set",
@@ -488,113 +2784,105 @@ async def slash_set_place_id(interaction: discord.Interaction, place_id: str):
     )
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@bot.tree.command(name="download", description="Download an audio file from Roblox")
-@app_commands.describe(asset_id="The Roblox audio asset ID")
-async def slash_download_audio(interaction: discord.Interaction, asset_id: str):
+@bot.tree.command(name="setmode", description="Set how your downloads are delivered by default")
+@app_commands.describe(mode="Default delivery mode for /download and !download")
+@app_commands.choices(mode=[
+    app_commands.Choice(name="One message per file", value="single"),
+    app_commands.Choice(name="Bundle files into fewer messages", value="bundle"),
+    app_commands.Choice(name="Single zip archive", value="zip"),
+])
+async def slash_set_output_mode(interaction: discord.Interaction, mode: app_commands.Choice[str]):
+    settings.set(str(interaction.user.id), output_mode=mode.value)
+    embed = discord.Embed(
+        title="✅ Output Mode Set",
+        description=f"Your downloads will now use `{mode.value}` mode by default.",
+        color=discord.Color.green()
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="download", description="Download audio files from Roblox")
+@app_commands.describe(
+    asset_ids="One or more Roblox audio asset IDs, separated by spaces or commas",
+    ids_file="A .txt or .csv file of asset IDs",
+    mode="How to deliver the files"
+)
+@app_commands.choices(mode=[
+    app_commands.Choice(name="One message per file", value="single"),
+    app_commands.Choice(name="Bundle files into fewer messages", value="bundle"),
+    app_commands.Choice(name="Single zip archive", value="zip"),
+])
+async def slash_download_audio(
+    interaction: discord.Interaction,
+    asset_ids: str = None,
+    ids_file: discord.Attachment = None,
+    mode: app_commands.Choice[str] = None
+):
     user_id = str(interaction.user.id)
     
     if user_id not in user_data or "cookie" not in user_data[user_id]:
-        embed = discord.Embed(
-            title="❌ Cookie Not Set",
-            description="You need to set your Roblox cookie first!\nUse `/setcookie` in DMs.",
-            color=discord.Color.red()
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embeds.get("slash_cookie_not_set"), ephemeral=True)
         return
         
-    if user_id not in user_data or "place_id" not in user_data[user_id]:
-        embed = discord.Embed(
-            title="❌ Place ID Not Set",
-            description="You need to set a Place ID first!\nUse `/setplaceid YOUR_PLACE_ID`.",
-            color=discord.Color.red()
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+    if not settings.get(user_id, "place_id"):
+        await interaction.response.send_message(embed=embeds.get("slash_place_not_set"), ephemeral=True)
+        return
+    
+    # Validate what we can without network calls before acknowledging the interaction
+    ids, invalid = parse_asset_ids(asset_ids or "")
+    if ids_file and ids_file.size > MAX_ID_FILE_BYTES:
+        await interaction.response.send_message(embed=embeds.get("id_file_too_large"), ephemeral=True)
+        return
+    
+    if not ids and not ids_file:
+        await interaction.response.send_message(embed=embeds.get("slash_missing_ids"), ephemeral=True)
+        return
+    
+    if overloaded():
+        await interaction.response.send_message(embed=embeds.get("busy"), ephemeral=True)
         return
     
+    # Fetching the attachment can take longer than Discord's 3 second acknowledgement window
     await interaction.response.defer()
     
+    if ids_file:
+        try:
+            file_ids = parse_id_file((await ids_file.read()).decode("utf-8", errors="ignore"))
+        except discord.HTTPException as e:
+            await interaction.followup.send(embed=error_embed("❌ Could Not Read File", f"Failed to download the ID file: {e}"))
+            return
+        ids = list(dict.fromkeys(ids + file_ids))
+        if not ids:
+            await interaction.followup.send(embed=embeds.get("slash_missing_ids"))
+            return
+            
+    if len(ids) > download_queue.per_user_limit:
+        await interaction.followup.send(embed=too_many_ids_embed(len(ids)))
+        return
+    
     roblox_cookie = user_data[user_id]["cookie"]
-    place_id = user_data[user_id]["place_id"]
+    place_id = settings.get(user_id, "place_id")
     
     try:
-        progress_msg = await interaction.followup.send(f"🔍 **Processing**\nDownloading asset `{asset_id}`...")
-        file_path, asset_info, error = await download_audio_file(asset_id, place_id, roblox_cookie)
-        
-        if error:
-            embed = discord.Embed(
-                title=f"❌ Download Failed",
-                description=f"Could not download asset `{asset_id}`",
-                color=discord.Color.red()
-            )
-            embed.add_field(name="Error", value=error, inline=False)
-            await progress_msg.edit(content=None, embed=embed)
-            return
-            
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Create embed with asset info
-        embed = await create_asset_embed(asset_info, asset_id)
-        embed.add_field(
-            name="File Info",
-            value=f"Size: {human_readable_size(file_size)}\nFormat: OGG",
-            inline=False
+        notice = f"\n⚠️ Skipped {len(invalid)} invalid ID(s): {', '.join(f'`{token[:20]}`' for token in invalid[:5])}" if invalid else ""
+        progress_msg = await interaction.followup.send(f"⏳ **Starting Download**\nProcessing {len(ids)} audio files...{notice}")
+        await run_download_job(
+            user_id, ids, place_id, roblox_cookie,
+            mode.value if mode else settings.get(user_id, "output_mode", DEFAULT_OUTPUT_MODE),
+            interaction.followup.send, progress_msg, "✅ **Download Complete**"
         )
         
-        with open(file_path, "rb") as f:
-            await interaction.followup.send(
-                content=f"✅ **Download Complete**",
-                embed=embed,
-                file=discord.File(f, filename=f"{sanitize_filename(asset_info.get('Name', asset_info.get('name', 'audio_' + str(asset_id))))}.ogg")
-            )
-        
-        await progress_msg.delete()
-        
     except Exception as e:
         embed = discord.Embed(
             title=f"❌ Unexpected Error",
-            description=f"An error occurred while processing asset `{asset_id}`",
+            description=f"An error occurred while processing {len(ids)} asset(s)",
             color=discord.Color.red()
         )
         embed.add_field(name="Details", value=str(e), inline=False)
         await interaction.followup.send(embed=embed)
-    
-    # Cleanup
-    try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except:
-        pass
 
 @bot.tree.command(name="commands", description="Show available commands")
 async def slash_commands_help(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="🤖 Roblox Audio Downloader Help",
-        description="All available commands for the bot",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(
-        name="🔐 Authentication",
-        value="• `/setcookie [cookie]` - Set your Roblox cookie (DM only)\n• `/setplaceid [place_id]` - Set the Roblox place ID",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="🎵 Audio Commands",
-        value="• `/download [asset_id]` - Download an audio file",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="🛠️ Utility",
-        value="• `/commands` - Show this help menu",
-        inline=False
-    )
-    
-    embed.set_footer(text="For security, always use cookie-related commands in DMs")
-    
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.response.send_message(embed=embeds.get("slash_help"), ephemeral=True)
 
 # Run the bot with your token
 if __name__ == "__main__":